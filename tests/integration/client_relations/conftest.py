@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# Copyright 2024 Canonical Ltd.
+# See LICENSE file for licensing details.
+import asyncio
+from typing import Dict, Tuple
+
+import pytest
+import pytest_asyncio
+from pytest_operator.plugin import OpsTest
+
+from ..helpers import (
+    MONGOS_PORT,
+    MongoClient,
+    get_address_of_unit,
+    get_direct_mongos_client,
+    get_mongos_user_password,
+)
+from .helpers import APPLICATION_APP_NAME
+
+
+@pytest_asyncio.fixture(scope="module")
+async def client_user(ops_test: OpsTest) -> Tuple[str, str, str, str]:
+    """Returns the username, password, mongos host and URI of the client application user."""
+    (username, password), mongos_host = await asyncio.gather(
+        get_mongos_user_password(
+            ops_test, app_name=APPLICATION_APP_NAME, relation_name="mongos"
+        ),
+        get_address_of_unit(ops_test, unit_id=0),
+    )
+    return (
+        username,
+        password,
+        mongos_host,
+        f"mongodb://{username}:{password}@{mongos_host}:{MONGOS_PORT}",
+    )
+
+
+@pytest_asyncio.fixture(scope="module")
+async def client_user_mongos_client(ops_test: OpsTest, client_user) -> MongoClient:
+    """Returns a client authenticated as the client application user, shared by the module."""
+    *_, client_user_uri = client_user
+    client = await get_direct_mongos_client(ops_test, uri=client_user_uri)
+    yield client
+    client.close()
+
+
+@pytest.fixture(scope="module")
+def external_mongos_clients() -> Dict[str, MongoClient]:
+    """Returns the external clients of the module indexed by URI, closed on teardown."""
+    clients: Dict[str, MongoClient] = {}
+    yield clients
+    for client in clients.values():
+        client.close()
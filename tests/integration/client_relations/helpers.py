@@ -1,17 +1,18 @@
 #!/usr/bin/env python3
 # Copyright 2024 Canonical Ltd.
 # See LICENSE file for licensing details.
-from typing import Tuple, List
-import json
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+import asyncio
 import logging
-from pathlib import Path
-import yaml
+import socket
 import subprocess
+import time
 
 from tenacity import (
     retry,
-    stop_after_attempt,
-    wait_fixed,
+    retry_if_exception_type,
+    stop_after_delay,
+    wait_exponential,
 )
 
 from ..helpers import (
@@ -20,6 +21,7 @@ from ..helpers import (
     get_application_relation_data,
     get_secret_data,
     get_mongos_user_password,
+    is_related,
 )
 
 
@@ -27,24 +29,24 @@ from pytest_operator.plugin import OpsTest
 from pymongo.errors import ServerSelectionTimeoutError
 
 
-PORT_MAPPING_INDEX = 4
-
 logger = logging.getLogger(__name__)
 
 APPLICATION_APP_NAME = "application"
-
-MONGODB_CHARM_NAME = "mongodb-k8s"
-CONFIG_SERVER_APP_NAME = "config-server"
-SHARD_APP_NAME = "shard0"
-MONGOS_PORT = 27018
-SHARD_REL_NAME = "sharding"
-CONFIG_SERVER_REL_NAME = "config-server"
-CLUSTER_REL_NAME = "cluster"
 DATA_INTEGRATOR_APP_NAME = "data-integrator"
-METADATA = yaml.safe_load(Path("./metadata.yaml").read_text())
 
+# fail fast on unreachable node ports rather than waiting for pymongo's 30s default
+EXTERNAL_CLIENT_TIMEOUT_MS = 2000
+PORT_CHECK_TIMEOUT = 1
+
+_public_k8s_ip: Optional[str] = None
 
-@retry(stop=stop_after_attempt(10), wait=wait_fixed(15), reraise=True)
+
+@retry(
+    stop=stop_after_delay(60),
+    wait=wait_exponential(multiplier=1, min=1, max=10),
+    retry=retry_if_exception_type((AssertionError, KeyError)),
+    reraise=True,
+)
 async def get_client_connection_string(
     ops_test: OpsTest, app_name=MONGOS_APP_NAME, relation_name="cluster"
 ) -> Tuple[str, str]:
@@ -57,6 +59,14 @@ async def get_client_connection_string(
     return secret_data.get("uris")
 
 
+def get_relation_endpoint_pairs(ops_test: OpsTest) -> Set[FrozenSet[str]]:
+    """Returns the endpoint names of every relation in the model."""
+    return {
+        frozenset(endpoint.name for endpoint in rel.endpoints)
+        for rel in ops_test.model.relations
+    }
+
+
 def is_relation_joined(ops_test: OpsTest, endpoint_one: str, endpoint_two: str) -> bool:
     """Check if a relation is joined.
 
@@ -65,100 +75,276 @@ def is_relation_joined(ops_test: OpsTest, endpoint_one: str, endpoint_two: str)
         endpoint_one: The first endpoint of the relation
         endpoint_two: The second endpoint of the relation
     """
-    for rel in ops_test.model.relations:
-        endpoints = [endpoint.name for endpoint in rel.endpoints]
-        if endpoint_one in endpoints and endpoint_two in endpoints:
-            return True
-    return False
+    return frozenset((endpoint_one, endpoint_two)) in get_relation_endpoint_pairs(
+        ops_test
+    )
+
+
+def list_node_ports(ops_test: OpsTest) -> Dict[str, int]:
+    """Returns the node ports exposed in the model, indexed by service name.
+
+    Services are filtered server side, so only `name=port` pairs are sent back rather than every
+    service manifest in the namespace.
+    """
+    result = subprocess.run(
+        [
+            "kubectl",
+            "get",
+            "svc",
+            "-n",
+            ops_test.model.name,
+            "-o",
+            'jsonpath={range .items[?(@.spec.type=="NodePort")]}'
+            '{.metadata.name}={.spec.ports[0].nodePort}{" "}{end}',
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    return {
+        name: int(port)
+        for name, port in (entry.split("=") for entry in result.stdout.split())
+    }
+
 
+def wait_for_node_port(
+    ops_test: OpsTest, node_port_name: str, present: bool = True, timeout: int = 60
+) -> None:
+    """Waits for the node port service to be created or deleted.
 
-def get_node_port_info(ops_test: OpsTest, node_port_name: str) -> str:
-    node_port_cmd = f"kubectl get svc  -n  {ops_test.model.name} |  grep NodePort | grep {node_port_name}"
-    return subprocess.run(node_port_cmd, shell=True, capture_output=True, text=True)
+    Uses the k8s watch API, so it returns as soon as the service converges. `kubectl wait` fails
+    straight away while the service does not exist yet, so that case is polled.
+    """
+    condition = "jsonpath={.spec.type}=NodePort" if present else "delete"
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = max(1, int(deadline - time.monotonic()))
+        result = subprocess.run(
+            [
+                "kubectl",
+                "wait",
+                f"--for={condition}",
+                f"svc/{node_port_name}",
+                "-n",
+                ops_test.model.name,
+                f"--timeout={remaining}s",
+            ],
+            capture_output=True,
+            text=True,
+            check=False,
+        )
+        if result.returncode == 0:
+            return
 
+        if present and "NotFound" in result.stderr and time.monotonic() < deadline:
+            time.sleep(1)
+            continue
 
-def has_node_port(ops_test: OpsTest, node_port_name: str) -> None:
-    result = get_node_port_info(ops_test, node_port_name)
-    return len(result.stdout.splitlines()) > 0
+        raise AssertionError(
+            f"node port service {node_port_name} did not converge: {result.stderr}"
+        )
 
 
-def get_port_from_node_port(ops_test: OpsTest, node_port_name: str) -> str:
-    result = get_node_port_info(ops_test, node_port_name)
+async def wait_for_all_unit_node_ports(ops_test: OpsTest, present: bool = True) -> None:
+    """Waits for the node port services of all mongos units to be created or deleted."""
+    await asyncio.gather(
+        *(
+            asyncio.to_thread(
+                wait_for_node_port,
+                ops_test,
+                f"{MONGOS_APP_NAME}-{unit_id}-external",
+                present,
+            )
+            for unit_id in range(
+                len(ops_test.model.applications[MONGOS_APP_NAME].units)
+            )
+        )
+    )
+
+
+def has_node_port(
+    ops_test: OpsTest, node_port_name: str, node_ports: Dict[str, int] = None
+) -> bool:
+    node_ports = list_node_ports(ops_test) if node_ports is None else node_ports
+    return node_port_name in node_ports
 
+
+async def run_kubectl(*args: str) -> Tuple[int, str]:
+    """Runs kubectl without blocking the event loop, returns its exit code and stdout."""
+    process = await asyncio.create_subprocess_exec(
+        "kubectl",
+        *args,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    stdout, _ = await process.communicate()
+    return process.returncode, stdout.decode().strip()
+
+
+async def get_port_from_node_port(
+    ops_test: OpsTest, node_port_name: str, node_ports: Dict[str, int] = None
+) -> str:
+    if node_ports is not None:
+        assert (
+            node_port_name in node_ports
+        ), "No port information available for expected service"
+        return str(node_ports[node_port_name])
+
+    ret_code, exposed_node_port = await run_kubectl(
+        "get",
+        "svc",
+        node_port_name,
+        "-n",
+        ops_test.model.name,
+        "-o",
+        "jsonpath={.spec.ports[0].nodePort}",
+    )
     assert (
-        len(result.stdout.splitlines()) > 0
+        ret_code == 0 and exposed_node_port
     ), "No port information available for expected service"
 
-    # port information is available at PORT_MAPPING_INDEX
-    port_mapping = result.stdout.split()[PORT_MAPPING_INDEX]
+    return exposed_node_port
 
-    # port information is of the form 27018:30259/TCP
-    return port_mapping.split(":")[1].split("/")[0]
 
-
-def assert_node_port_availablity(
-    ops_test: OpsTest, node_port_name: str, available: bool = True
+def assert_node_port_availability(
+    ops_test: OpsTest,
+    node_port_name: str,
+    available: bool = True,
+    node_ports: Dict[str, int] = None,
 ) -> None:
-    incorrect_availablity = "not available" if available else "is available"
+    incorrect_availability = "not available" if available else "is available"
     assert (
-        has_node_port(ops_test, node_port_name) == available
-    ), f"Port information {incorrect_availablity} for service"
+        has_node_port(ops_test, node_port_name, node_ports) == available
+    ), f"Port information {incorrect_availability} for service"
+
+
+@retry(
+    stop=stop_after_delay(60),
+    wait=wait_exponential(multiplier=1, min=1, max=10),
+    retry=retry_if_exception_type(AssertionError),
+    reraise=True,
+)
+async def assert_external_mongos_client_reachable(
+    ops_test: OpsTest, exposed_node_port: str, clients: Dict[str, MongoClient]
+) -> None:
+    """Asserts that the mongos client is reachable, the node port can take a while to route."""
+    assert await is_external_mongos_client_reachable(
+        ops_test, exposed_node_port, clients
+    ), "client is not reachable"
 
 
-async def assert_all_unit_node_ports_available(ops_test: OpsTest):
+async def assert_all_unit_node_ports_available(
+    ops_test: OpsTest, clients: Dict[str, MongoClient]
+):
     """Assert all ports available in mongos deployment."""
-    for unit_id in range(len(ops_test.model.applications[MONGOS_APP_NAME].units)):
-        assert_node_port_availablity(
-            ops_test, node_port_name=f"{MONGOS_APP_NAME}-{unit_id}-external"
+    await wait_for_all_unit_node_ports(ops_test, present=True)
+    node_ports = await asyncio.to_thread(list_node_ports, ops_test)
+
+    async def _check_unit(unit_id: int) -> None:
+        node_port_name = f"{MONGOS_APP_NAME}-{unit_id}-external"
+        assert_node_port_availability(
+            ops_test, node_port_name=node_port_name, node_ports=node_ports
         )
 
-        exposed_node_port = get_port_from_node_port(
-            ops_test, node_port_name=f"{MONGOS_APP_NAME}-{unit_id}-external"
+        exposed_node_port = await get_port_from_node_port(
+            ops_test, node_port_name=node_port_name, node_ports=node_ports
         )
 
-        assert await is_external_mongos_client_reachable(
-            ops_test, exposed_node_port
-        ), "client is not reachable"
+        await assert_external_mongos_client_reachable(
+            ops_test, exposed_node_port, clients
+        )
+
+    await asyncio.gather(
+        *(
+            _check_unit(unit_id)
+            for unit_id in range(
+                len(ops_test.model.applications[MONGOS_APP_NAME].units)
+            )
+        )
+    )
 
 
 async def get_external_uri(
     ops_test: OpsTest, unit_id, exposed_node_port: str = None
 ) -> str:
-    exposed_node_port = exposed_node_port or get_port_from_node_port(
+    exposed_node_port = exposed_node_port or await get_port_from_node_port(
         ops_test, node_port_name=f"{MONGOS_APP_NAME}-{unit_id}-external"
     )
 
-    public_k8s_ip = get_public_k8s_ip()
-    username, password = await get_mongos_user_password(ops_test, MONGOS_APP_NAME)
+    public_k8s_ip, (username, password) = await asyncio.gather(
+        get_public_k8s_ip(), get_mongos_user_password(ops_test, MONGOS_APP_NAME)
+    )
     return f"mongodb://{username}:{password}@{public_k8s_ip}:{exposed_node_port}"
 
 
+def get_external_mongos_client(
+    clients: Dict[str, MongoClient], uri: str
+) -> MongoClient:
+    """Returns a client for the provided external URI, reusing it from `clients`.
+
+    See the `external_mongos_clients` fixture, which closes the clients after the module.
+    """
+    if uri not in clients:
+        clients[uri] = MongoClient(
+            uri,
+            serverSelectionTimeoutMS=EXTERNAL_CLIENT_TIMEOUT_MS,
+            connectTimeoutMS=EXTERNAL_CLIENT_TIMEOUT_MS,
+            socketTimeoutMS=EXTERNAL_CLIENT_TIMEOUT_MS,
+        )
+
+    return clients[uri]
+
+
+def is_port_open(host: str, port: str, timeout: float = PORT_CHECK_TIMEOUT) -> bool:
+    """Returns True if a TCP connection can be established to the provided host and port."""
+    try:
+        with socket.create_connection((host, int(port)), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
 async def is_external_mongos_client_reachable(
-    ops_test: OpsTest, exposed_node_port: str
+    ops_test: OpsTest,
+    exposed_node_port: str,
+    clients: Dict[str, MongoClient],
+    fast_fail: bool = False,
 ) -> bool:
-    """Returns True if the mongos client is reachable on the provided node port via the k8s ip."""
-    public_k8s_ip = get_public_k8s_ip()
+    """Returns True if the mongos client is reachable on the provided node port via the k8s ip.
+
+    Set `fast_fail` when the node port is expected to be closed, a closed port is then reported
+    after a single TCP probe rather than once server selection times out.
+    """
+    public_k8s_ip = await get_public_k8s_ip()
+    if fast_fail and not await asyncio.to_thread(
+        is_port_open, public_k8s_ip, exposed_node_port
+    ):
+        return False
+
     username, password = await get_mongos_user_password(ops_test, MONGOS_APP_NAME)
+    external_mongos_client = get_external_mongos_client(
+        clients, f"mongodb://{username}:{password}@{public_k8s_ip}:{exposed_node_port}"
+    )
     try:
-        external_mongos_client = MongoClient(
-            f"mongodb://{username}:{password}@{public_k8s_ip}:{exposed_node_port}"
-        )
-        external_mongos_client.admin.command("usersInfo")
+        # pymongo is blocking, run it off the event loop so units can be checked concurrently
+        await asyncio.to_thread(external_mongos_client.admin.command, "usersInfo")
     except ServerSelectionTimeoutError:
         return False
-    finally:
-        external_mongos_client.close()
 
     return True
 
 
 async def assert_all_unit_node_ports_are_unavailable(ops_test: OpsTest):
     """Assert all ports available in mongos deployment."""
+    await wait_for_all_unit_node_ports(ops_test, present=False)
+    node_ports = await asyncio.to_thread(list_node_ports, ops_test)
     for unit_id in range(len(ops_test.model.applications[MONGOS_APP_NAME].units)):
-        assert_node_port_availablity(
+        assert_node_port_availability(
             ops_test,
             node_port_name=f"{MONGOS_APP_NAME}-{unit_id}-external",
             available=False,
+            node_ports=node_ports,
         )
 
 
@@ -169,29 +355,39 @@ def get_k8s_local_mongodb_hosts(ops_test: OpsTest) -> List[str]:
     ]
 
 
-def get_public_k8s_ip() -> str:
-    result = subprocess.run(
-        "kubectl get nodes -o json", shell=True, capture_output=True, text=True
-    )
-
-    if result.returncode:
-        logger.info("failed to retrieve public facing k8s IP error: %s", result.stderr)
-        assert False, "failed to retrieve public facing k8s IP"
+async def get_public_k8s_ip() -> str:
+    """Returns the public facing IP of the k8s cluster.
 
-    node_info = json.loads(result.stdout)
+    The IP is stable for the lifetime of the cluster, so it is only queried once per session.
+    """
+    global _public_k8s_ip
+
+    if _public_k8s_ip is None:
+        ret_code, public_k8s_ip = await run_kubectl(
+            "get",
+            "nodes",
+            "-o",
+            'jsonpath={.items[0].status.addresses[?(@.type=="InternalIP")].address}',
+        )
+        assert (
+            ret_code == 0 and public_k8s_ip
+        ), "failed to retrieve public facing k8s IP"
+        _public_k8s_ip = public_k8s_ip
 
-    try:
-        return node_info["items"][0]["status"]["addresses"][0]["address"]
-    except KeyError:
-        assert False, "failed to retrieve public facing k8s IP"
+    return _public_k8s_ip
 
 
 async def deploy_client_app(ops_test: OpsTest, external: bool):
-    if not external:
-        application_charm = await ops_test.build_charm("tests/integration/application/")
-    else:
-        application_charm = DATA_INTEGRATOR_APP_NAME
-    await ops_test.model.deploy(application_charm)
+    """Deploys the client application, unless it is already deployed."""
+    app_name = DATA_INTEGRATOR_APP_NAME if external else APPLICATION_APP_NAME
+    if app_name not in ops_test.model.applications:
+        if not external:
+            application_charm = await ops_test.build_charm(
+                "tests/integration/application/"
+            )
+        else:
+            application_charm = DATA_INTEGRATOR_APP_NAME
+        await ops_test.model.deploy(application_charm)
     await ops_test.model.wait_for_idle(
         apps=[APPLICATION_APP_NAME],
         idle_period=10,
@@ -200,7 +396,9 @@ async def deploy_client_app(ops_test: OpsTest, external: bool):
 
 
 async def integrate_client_app(ops_test: OpsTest, client_app_name: str):
-    await ops_test.model.integrate(client_app_name, MONGOS_APP_NAME)
+    """Integrates the client application with mongos, unless they are already integrated."""
+    if not is_related(ops_test, client_app_name, MONGOS_APP_NAME):
+        await ops_test.model.integrate(client_app_name, MONGOS_APP_NAME)
     await ops_test.model.wait_for_idle(
         apps=[client_app_name, MONGOS_APP_NAME], status="active", idle_period=20
     )
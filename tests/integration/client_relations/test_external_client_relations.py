@@ -4,11 +4,10 @@
 
 
 import pytest
+import pytest_asyncio
 from pytest_operator.plugin import OpsTest
 
 from ..helpers import (
-    deploy_cluster_components,
-    build_cluster,
     MONGOS_APP_NAME,
     wait_for_mongos_units_blocked,
 )
@@ -27,19 +26,13 @@ from .helpers import (
     get_k8s_local_mongodb_hosts,
 )
 
+# the tests change the deployed cluster, see `--reuse-cluster`
+pytestmark = pytest.mark.usefixtures("modifies_cluster")
 
-TEST_USER_NAME = "TestUserName1"
-TEST_USER_PWD = "Test123"
-TEST_DB_NAME = "my-test-db"
-
-
-@pytest.mark.group(1)
-@pytest.mark.abort_on_fail
-async def test_build_and_deploy(ops_test: OpsTest):
-    """Build and deploy a sharded cluster."""
-    await deploy_cluster_components(ops_test)
-    await build_cluster(ops_test)
 
+@pytest_asyncio.fixture(scope="module")
+async def deployed_clients(ops_test: OpsTest, deployed_cluster):
+    """Deploys and integrates the internal and external client applications."""
     await deploy_client_app(ops_test, external=False)
     await integrate_client_app(ops_test, client_app_name=APPLICATION_APP_NAME)
 
@@ -50,28 +43,43 @@ async def test_build_and_deploy(ops_test: OpsTest):
     await integrate_client_app(ops_test, client_app_name=DATA_INTEGRATOR_APP_NAME)
 
 
-@pytest.mark.group(1)
-@pytest.mark.abort_on_fail
-async def test_mongos_external_connections(ops_test: OpsTest) -> None:
-    """Tests that mongos is accessible externally."""
-    configuration_parameters = {"expose-external": "nodeport"}
+@pytest_asyncio.fixture(scope="module")
+async def mongos_nodeport(ops_test: OpsTest, deployed_clients):
+    """Exposes mongos externally via nodeport."""
+    await ops_test.model.applications[MONGOS_APP_NAME].set_config(
+        {"expose-external": "nodeport"}
+    )
+    # node port assertions wait on the services themselves, only need mongos to settle
+    await ops_test.model.wait_for_idle(
+        apps=[MONGOS_APP_NAME], status="active", idle_period=5
+    )
+    yield
 
-    # apply new configuration options
+    # close the node ports again, so that later modules start from an unexposed mongos
     await ops_test.model.applications[MONGOS_APP_NAME].set_config(
-        configuration_parameters
+        {"expose-external": "none"}
     )
     await ops_test.model.wait_for_idle(
-        apps=[MONGOS_APP_NAME], status="active", idle_period=15
+        apps=[MONGOS_APP_NAME], status="active", idle_period=5
     )
 
+
+@pytest.mark.group(1)
+@pytest.mark.abort_on_fail
+async def test_mongos_external_connections(
+    ops_test: OpsTest, mongos_nodeport, external_mongos_clients
+) -> None:
+    """Tests that mongos is accessible externally."""
     # verify each unit has a node port available
-    await assert_all_unit_node_ports_available(ops_test)
+    await assert_all_unit_node_ports_available(ops_test, external_mongos_clients)
 
 
 @pytest.mark.group(1)
 @pytest.mark.skip("Add in once DPE-5314 is addressed.")
 @pytest.mark.abort_on_fail
-async def test_mongos_external_connections_scale(ops_test: OpsTest) -> None:
+async def test_mongos_external_connections_scale(
+    ops_test: OpsTest, external_mongos_clients
+) -> None:
     """Tests that new mongos units are accessible externally."""
     await ops_test.model.applications[MONGOS_APP_NAME].scale(2)
     await ops_test.model.wait_for_idle(
@@ -79,12 +87,14 @@ async def test_mongos_external_connections_scale(ops_test: OpsTest) -> None:
     )
 
     # verify each unit has a node port available
-    await assert_all_unit_node_ports_available(ops_test)
+    await assert_all_unit_node_ports_available(ops_test, external_mongos_clients)
 
 
 @pytest.mark.group(1)
 @pytest.mark.abort_on_fail
-async def test_mongos_bad_configuration(ops_test: OpsTest) -> None:
+async def test_mongos_bad_configuration(
+    ops_test: OpsTest, external_mongos_clients
+) -> None:
     """Tests that mongos is accessible externally."""
     configuration_parameters = {"expose-external": "nonsensical-setting"}
 
@@ -102,7 +112,7 @@ async def test_mongos_bad_configuration(ops_test: OpsTest) -> None:
     )
 
     # verify new-configuration didn't break old configuration
-    await assert_all_unit_node_ports_available(ops_test)
+    await assert_all_unit_node_ports_available(ops_test, external_mongos_clients)
 
     # reset config for other tests
     configuration_parameters = {"expose-external": "nodeport"}
@@ -128,10 +138,12 @@ async def test_all_clients_use_nodeport(ops_test: OpsTest) -> None:
 
 @pytest.mark.group(1)
 @pytest.mark.abort_on_fail
-async def test_mongos_disable_external_connections(ops_test: OpsTest) -> None:
+async def test_mongos_disable_external_connections(
+    ops_test: OpsTest, external_mongos_clients
+) -> None:
     """Tests that mongos can disable external connections."""
     # get exposed node port before toggling off exposure
-    exposed_node_port = get_port_from_node_port(
+    exposed_node_port = await get_port_from_node_port(
         ops_test, node_port_name=f"{MONGOS_APP_NAME}-0-external"
     )
 
@@ -150,7 +162,9 @@ async def test_mongos_disable_external_connections(ops_test: OpsTest) -> None:
     # verify each unit has a node port available
     await assert_all_unit_node_ports_are_unavailable(ops_test)
 
-    assert not await is_external_mongos_client_reachable(ops_test, exposed_node_port)
+    assert not await is_external_mongos_client_reachable(
+        ops_test, exposed_node_port, external_mongos_clients, fast_fail=True
+    )
 
     await assert_app_uri_matches_external_setting(
         ops_test, app_name=DATA_INTEGRATOR_APP_NAME, rel_name="mongodb", external=False
@@ -167,7 +181,7 @@ async def assert_app_uri_matches_external_setting(
         ops_test, app_name=app_name, relation_name=rel_name
     )
 
-    pulic_ip_present_in_uri = get_public_k8s_ip() in uri
+    pulic_ip_present_in_uri = await get_public_k8s_ip() in uri
     assert (
         pulic_ip_present_in_uri == external
     ), f"client URI for {app_name} has incorrect hosts."
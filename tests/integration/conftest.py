@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# Copyright 2024 Canonical Ltd.
+# See LICENSE file for licensing details.
+import asyncio
+import contextlib
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+from pytest_operator.plugin import OpsTest
+
+from .helpers import (
+    MONGOS_APP_NAME,
+    MongoClient,
+    build_charm_once,
+    charm_source_hash,
+    deploy_backing_cluster,
+    deploy_mongos,
+    get_direct_mongos_client,
+    integrate_mongos_with_cluster,
+    invalidate_mongos_credentials,
+    is_cluster_deployed,
+    watch_juju_status,
+)
+from .tls.helpers import invalidate_mongos_uris
+
+CLUSTER_CACHE_KEY = "mongos/cluster"
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--reuse-cluster",
+        action="store_true",
+        default=False,
+        help="Reuse the cluster deployed by a previous run on the same model (use with "
+        "--model and --keep-models) when the charm sources did not change.",
+    )
+
+
+def _cluster_cache_key(ops_test: OpsTest) -> str:
+    return f"{CLUSTER_CACHE_KEY}/{ops_test.model_full_name}"
+
+
+def _mongos_charm_url(ops_test: OpsTest) -> str | None:
+    application = ops_test.model.applications.get(MONGOS_APP_NAME)
+    return application.charm_url if application else None
+
+
+@pytest_asyncio.fixture(scope="module", autouse=True)
+async def juju_status_stream(ops_test: OpsTest):
+    """Keeps the model status cache warm from one long-lived `juju status --watch` process."""
+    watcher = asyncio.create_task(watch_juju_status(ops_test))
+    yield
+    watcher.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await watcher
+
+
+@pytest_asyncio.fixture(scope="module")
+async def built_charm(ops_test: OpsTest) -> Path:
+    """Returns the mongos charm, built once for the whole test session."""
+    return await build_charm_once(ops_test)
+
+
+@pytest.fixture(scope="module")
+def mongos_units() -> int:
+    """Number of mongos units deployed by `deployed_cluster`, overridden per test package."""
+    return 1
+
+
+@pytest_asyncio.fixture(scope="module")
+async def deployed_cluster(
+    ops_test: OpsTest,
+    request: pytest.FixtureRequest,
+    built_charm: Path,
+    mongos_units: int,
+) -> None:
+    """Deploys the cluster components and integrates them into a sharded cluster.
+
+    Components and relations which already exist are kept, so the cluster of a reused model is
+    only completed and its mongos scaled to `mongos_units`.
+    """
+    reuse_cluster = request.config.getoption("--reuse-cluster")
+    if reuse_cluster:
+        cache_key = _cluster_cache_key(ops_test)
+        source_hash = charm_source_hash()
+        cached_cluster = request.config.cache.get(cache_key, None) or {}
+        deployed = {
+            "source": source_hash,
+            "charm": _mongos_charm_url(ops_test),
+            "units": mongos_units,
+        }
+        if (
+            cached_cluster == deployed
+            and is_cluster_deployed(ops_test)
+            and len(ops_test.model.applications[MONGOS_APP_NAME].units) == mongos_units
+        ):
+            return
+
+        if (
+            cached_cluster
+            and deployed["charm"]
+            and any(
+                cached_cluster.get(key) != deployed[key] for key in ("source", "charm")
+            )
+        ):
+            # mongos does not run the charm built from these sources, e.g. after a refresh,
+            # deploy it again rather than reusing it
+            await ops_test.model.remove_application(
+                MONGOS_APP_NAME, block_until_done=True
+            )
+            # the credentials and URIs of the removed mongos do not apply to the new one
+            invalidate_mongos_credentials(ops_test)
+            invalidate_mongos_uris()
+
+    # the sharded cluster is built while mongos is still coming up
+    await asyncio.gather(
+        deploy_backing_cluster(ops_test, integrate=True),
+        deploy_mongos(ops_test, n_units=mongos_units, prebuilt_charm=built_charm),
+    )
+    await integrate_mongos_with_cluster(ops_test)
+
+    if reuse_cluster:
+        request.config.cache.set(
+            cache_key,
+            {
+                "source": source_hash,
+                "charm": _mongos_charm_url(ops_test),
+                "units": mongos_units,
+            },
+        )
+
+
+@pytest.fixture(scope="module")
+def modifies_cluster(ops_test: OpsTest, request: pytest.FixtureRequest):
+    """Marks a module which changes the deployed cluster, so it is not reused as is afterwards.
+
+    The next `deployed_cluster` completes the cluster again, its mongos is redeployed only if it
+    no longer runs the cached charm.
+    """
+    yield
+    cache_key = _cluster_cache_key(ops_test)
+    cached_cluster = request.config.cache.get(cache_key, None)
+    if cached_cluster:
+        request.config.cache.set(cache_key, {**cached_cluster, "modified": True})
+
+
+@pytest_asyncio.fixture(scope="module")
+async def mongos_client(ops_test: OpsTest) -> MongoClient:
+    """Returns a client to the first mongos unit, authenticated as the charm user.
+
+    The client is only created when first requested, so it must be requested once mongos is
+    integrated with the config-server.
+    """
+    client = await get_direct_mongos_client(ops_test, unit_id=0, auth=True)
+    yield client
+    client.close()
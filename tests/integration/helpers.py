@@ -2,26 +2,44 @@
 # Copyright 2024 Canonical Ltd.
 # See LICENSE file for licensing details.
 
-import subprocess
+import asyncio
+import hashlib
 import json
 import logging
+import os
+import re
+import shutil
+import time
+import zipfile
 
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
+from functools import lru_cache
 from pathlib import Path
 import yaml
 from pymongo import MongoClient
+from pymongo.errors import AutoReconnect, PyMongoError
 
-from dateutil.parser import parse
+from juju.client import client
 from pytest_operator.plugin import OpsTest
-from tenacity import Retrying, stop_after_delay, wait_fixed
+from tenacity import (
+    AsyncRetrying,
+    retry,
+    retry_if_exception_type,
+    stop_after_delay,
+    wait_exponential,
+    wait_random,
+)
 from tenacity import (
     RetryError,
 )
 
-logger = logging.getLogger(__name__)
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
 
-PORT_MAPPING_INDEX = 4
+logger = logging.getLogger(__name__)
 
 MONGOS_APP_NAME = "mongos-k8s"
 MONGODB_CHARM_NAME = "mongodb-k8s"
@@ -31,119 +49,178 @@ MONGOS_PORT = 27018
 SHARD_REL_NAME = "sharding"
 CONFIG_SERVER_REL_NAME = "config-server"
 CLUSTER_REL_NAME = "cluster"
-
-METADATA = yaml.safe_load(Path("./metadata.yaml").read_text())
-
-
-class Status:
-    """Model class for status."""
-
-    def __init__(self, value: str, since: str, message: Optional[str] = None):
-        self.value = value
-        self.since = parse(since, ignoretz=True)
-        self.message = message
-
-
-class Unit:
-    """Model class for a Unit, with properties widely used."""
-
-    def __init__(
-        self,
-        id: int,
-        name: str,
-        ip: str,
-        hostname: str,
-        is_leader: bool,
-        workload_status: Status,
-        agent_status: Status,
-        app_status: Status,
-    ):
-        self.id = id
-        self.name = name
-        self.ip = ip
-        self.hostname = hostname
-        self.is_leader = is_leader
-        self.workload_status = workload_status
-        self.agent_status = agent_status
-        self.app_status = app_status
-
-    def dump(self) -> Dict[str, Any]:
-        """To json."""
-        result = {}
-        for key, val in vars(self).items():
-            result[key] = vars(val) if isinstance(val, Status) else val
-        return result
-
-
-async def get_application_units(ops_test: OpsTest, app: str) -> List[Unit]:
-    """Get fully detailed units of an application."""
-    # Juju incorrectly reports the IP addresses after the network is restored this is reported as a
-    # bug here: https://github.com/juju/python-libjuju/issues/738. Once this bug is resolved use of
-    # `get_unit_ip` should be replaced with `.public_address`
-    raw_app = await get_raw_application(ops_test, app)
-    units = []
+TEST_USER_NAME = "TestUserName1"
+TEST_USER_PWD = "Test123"
+TEST_DB_NAME = "my-test-db"
+# mongos is reached directly, there is no reason to wait on pymongo's 30s/20s defaults
+MONGOS_CLIENT_TIMEOUT_MS = 2000
+MONGOS_CLIENT_SOCKET_TIMEOUT_MS = 5000
+# for callers expecting mongos to be unreachable
+MONGOS_CLIENT_FAST_FAIL_TIMEOUT_MS = 500
+
+# credentials do not change during a test module, cache them per (model, app, relation)
+_mongos_credentials: Dict[Tuple[str, str, str], Tuple[str, str]] = {}
+_mongos_credentials_locks: Dict[Tuple[str, str, str], asyncio.Lock] = {}
+
+_charm_path: Optional[Path] = None
+# pytest cache directory keeping the charm variants used by the upgrade tests across runs
+UPGRADE_CHARMS_CACHE_DIR = "upgrade-charms"
+
+# seconds between the frames of `juju status --watch`
+JUJU_STATUS_WATCH_INTERVAL = 2
+# back-to-back status lookups within this many seconds share a single `juju status` call. A
+# watched frame lands every interval plus the time `juju status` takes, so it must outlive that
+JUJU_STATUS_TTL = 2.0 * JUJU_STATUS_WATCH_INTERVAL
+_juju_status_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+_juju_status_locks: Dict[str, asyncio.Lock] = {}
+# bumped on invalidation, so that the watcher drops a frame read across an invalidation
+_juju_status_generation = 0
+# a `juju status --watch` frame is a single JSON line, well over asyncio's 64KiB default
+JUJU_STATUS_STREAM_LIMIT = 16 * 1024 * 1024
+
+
+@lru_cache(maxsize=1)
+def _metadata() -> Dict[str, Any]:
+    """Returns the charm metadata, parsed on first use."""
+    return yaml.load(Path("./metadata.yaml").read_text(), Loader=SafeLoader)
+
+
+def iter_unit_statuses(
+    raw_app: Dict[str, Any],
+) -> Iterator[Tuple[str, str, Optional[str]]]:
+    """Yields the name, workload status and status message of the ready units of an application."""
     for u_name, unit in raw_app["units"].items():
-        unit_id = int(u_name.split("/")[-1])
         if not unit.get("address", False):
             # unit not ready yet...
             continue
 
-        unit = Unit(
-            id=unit_id,
-            name=u_name.replace("/", "-"),
-            ip=unit["address"],
-            hostname=await get_unit_hostname(ops_test, unit_id, app),
-            is_leader=unit.get("leader", False),
-            workload_status=Status(
-                value=unit["workload-status"]["current"],
-                since=unit["workload-status"]["since"],
-                message=unit["workload-status"].get("message"),
-            ),
-            agent_status=Status(
-                value=unit["juju-status"]["current"],
-                since=unit["juju-status"]["since"],
-            ),
-            app_status=Status(
-                value=raw_app["application-status"]["current"],
-                since=raw_app["application-status"]["since"],
-                message=raw_app["application-status"].get("message"),
-            ),
+        yield (
+            u_name.replace("/", "-"),
+            unit["workload-status"]["current"],
+            unit["workload-status"].get("message"),
         )
 
-        units.append(unit)
-
-    return units
-
 
 async def check_all_units_blocked_with_status(
-    ops_test: OpsTest, db_app_name: str, status: Optional[str]
+    ops_test: OpsTest,
+    db_app_name: str,
+    status: Optional[str],
+    model_name: Optional[str] = None,
 ) -> None:
     # this is necessary because ops_model.units does not update the unit statuses
-    for unit in await get_application_units(ops_test, db_app_name):
-        assert (
-            unit.workload_status.value == "blocked"
-        ), f"unit {unit.name} not in blocked state, in {unit.workload_status.value}"
+    raw_app = await get_raw_application(ops_test, db_app_name, model_name=model_name)
+    for name, value, message in iter_unit_statuses(raw_app):
+        assert value == "blocked", f"unit {name} not in blocked state, in {value}"
         if status:
-            assert (
-                unit.workload_status.message == status
-            ), f"unit {unit.name} not in blocked state, in {unit.workload_status.value}"
+            assert message == status, f"unit {name} not in blocked state, in {value}"
+
+
+async def get_juju_status_json(
+    ops_test: OpsTest, ttl: float = JUJU_STATUS_TTL, model_name: Optional[str] = None
+) -> Dict[str, Any]:
+    """Returns the parsed status of the model, reusing a status younger than `ttl` seconds.
+
+    Poll loops can resolve `model_name` once and pass it, skipping the libjuju model lookup.
+    """
+    model_name = model_name or ops_test.model.info.name
+    # concurrent callers (e.g. gathered unit checks) wait on a single `juju status` call
+    async with _juju_status_locks.setdefault(model_name, asyncio.Lock()):
+        cached = _juju_status_cache.get(model_name)
+        if cached and time.monotonic() - cached[0] < ttl:
+            return cached[1]
+
+        ret_code, stdout, stderr = await ops_test.juju(
+            *f"status --model {model_name} --format=json --utc".split()
+        )
+        if ret_code != 0:
+            logger.error(f"Invalid return [{ret_code=}]: {stderr=}")
+            raise Exception(f"[{ret_code=}] {stderr=}")
+
+        status = json.loads(stdout)
+        _juju_status_cache[model_name] = (time.monotonic(), status)
+        return status
+
+
+async def watch_juju_status(
+    ops_test: OpsTest, interval: int = JUJU_STATUS_WATCH_INTERVAL
+) -> None:
+    """Feeds the status cache from a single `juju status --watch` process until cancelled.
+
+    While this runs `get_juju_status_json` is served from memory, it falls back to spawning
+    `juju status` whenever the stream lags behind the TTL. Errors are logged rather than raised,
+    the cache is then simply no longer fed.
+    """
+    model_name = ops_test.model.info.name
+    try:
+        process = await asyncio.create_subprocess_exec(
+            "juju",
+            "status",
+            "--model",
+            ops_test.model_full_name,
+            f"--watch={interval}s",
+            "--format=json",
+            "--utc",
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            limit=JUJU_STATUS_STREAM_LIMIT,
+        )
+    except OSError as e:
+        logger.warning(f"Cannot watch juju status, falling back to polling: {e}")
+        return
+
+    frames = 0
+    try:
+        while True:
+            generation = _juju_status_generation
+            try:
+                line = await process.stdout.readline()
+            except ValueError as e:
+                # the frame exceeds the stream limit, it is discarded by the reader
+                logger.warning(f"Skipping juju status frame: {e}")
+                continue
+            if not line:
+                break
+
+            # the watcher may prefix a frame with terminal control sequences or a header
+            start = line.find(b"{")
+            if start == -1:
+                continue
+            try:
+                status = json.loads(line[start:])
+            except json.JSONDecodeError as e:
+                logger.warning(f"Skipping unparsable juju status frame: {e}")
+                continue
+            frames += 1
+            if generation != _juju_status_generation:
+                # the cache was invalidated while the frame was read, it may predate the change
+                continue
+            _juju_status_cache[model_name] = (time.monotonic(), status)
+    except Exception as e:
+        logger.warning(f"Stopped watching juju status, falling back to polling: {e}")
+    finally:
+        if not frames:
+            logger.warning(
+                "juju status --watch produced no status, the cache was not fed"
+            )
+        if process.returncode is None:
+            process.terminate()
+            await process.wait()
 
 
-async def get_unit_hostname(ops_test: OpsTest, unit_id: int, app: str) -> str:
-    """Get the hostname of a specific unit."""
-    _, hostname, _ = await ops_test.juju("ssh", f"{app}/{unit_id}", "hostname")
-    return hostname.strip()
+def invalidate_juju_status_cache() -> None:
+    """Drops cached statuses, for callers that just changed the model."""
+    global _juju_status_generation
 
+    _juju_status_generation += 1
+    _juju_status_cache.clear()
 
-async def get_raw_application(ops_test: OpsTest, app: str) -> Dict[str, Any]:
+
+async def get_raw_application(
+    ops_test: OpsTest, app: str, model_name: Optional[str] = None
+) -> Dict[str, Any]:
     """Get raw application details."""
-    ret_code, stdout, stderr = await ops_test.juju(
-        *f"status --model {ops_test.model.info.name} {app} --format=json".split()
-    )
-    if ret_code != 0:
-        logger.error(f"Invalid return [{ret_code=}]: {stderr=}")
-        raise Exception(f"[{ret_code=}] {stderr=}")
-    return json.loads(stdout)["applications"][app]
+    status = await get_juju_status_json(ops_test, model_name=model_name)
+    return status["applications"][app]
 
 
 async def wait_for_mongos_units_blocked(
@@ -153,29 +230,195 @@ async def wait_for_mongos_units_blocked(
 
     This is necessary because the MongoDB app can report a different status than the units.
     """
+    invalidate_juju_status_cache()
+    model_name = ops_test.model.info.name
+    try:
+        # the charm usually reports the status on the relation event already, in which case
+        # there is no need to speed up update-status
+        await check_all_units_blocked_with_status(
+            ops_test, db_app_name, status, model_name=model_name
+        )
+        return
+    except AssertionError:
+        pass
+
     hook_interval_key = "update-status-hook-interval"
     try:
         old_interval = (await ops_test.model.get_config())[hook_interval_key]
         await ops_test.model.set_config({hook_interval_key: "1m"})
-        for attempt in Retrying(
-            stop=stop_after_delay(timeout), wait=wait_fixed(1), reraise=True
+        async for attempt in AsyncRetrying(
+            stop=stop_after_delay(timeout),
+            wait=wait_exponential(multiplier=1, min=1, max=15) + wait_random(0, 1),
+            reraise=True,
         ):
             with attempt:
-                await check_all_units_blocked_with_status(ops_test, db_app_name, status)
+                await check_all_units_blocked_with_status(
+                    ops_test, db_app_name, status, model_name=model_name
+                )
     finally:
         await ops_test.model.set_config({hook_interval_key: old_interval})
 
 
-async def deploy_cluster_components(
-    ops_test: OpsTest, channel: str | None = None, n_units: int = 1
+async def wait_until_settled(
+    ops_test: OpsTest,
+    apps: List[str],
+    status: Optional[str] = None,
+    timeout: int = 600,
+    relations: Tuple[Tuple[str, str], ...] = (),
+    wait_for_exact_units: Optional[Dict[str, int]] = None,
+    idle_period: int = 5,
 ) -> None:
-    """Deploys all cluster components and waits for idle."""
+    """Waits until all units of the provided apps are idle, and in `status` if provided.
+
+    Unlike `wait_for_idle` the condition only has to hold for a short `idle_period`, as there is
+    no need to wait for update-status. Pass the `relations` just integrated, as `<app>:<endpoint>`
+    pairs, so the wait is not satisfied before the relations exist in the model; this does not
+    guarantee that their hooks ran, which the `status` and the idle period are relied upon for.
+    Pass `wait_for_exact_units` for apps which were just deployed or scaled, so the wait is not
+    satisfied by the units which already settled.
+    """
+    wait_for_exact_units = wait_for_exact_units or {}
+    settled_since: Optional[float] = None
+
+    def _holds() -> bool:
+        for relation in relations:
+            if not any(rel.matches(*relation) for rel in ops_test.model.relations):
+                return False
+
+        for app in apps:
+            application = ops_test.model.applications.get(app)
+            if not application or not application.units:
+                return False
+            if (
+                app in wait_for_exact_units
+                and len(application.units) != wait_for_exact_units[app]
+            ):
+                return False
+
+            for unit in application.units:
+                if unit.agent_status != "idle":
+                    return False
+                if status and unit.workload_status != status:
+                    return False
+
+        return True
+
+    def _settled() -> bool:
+        nonlocal settled_since
+        if not _holds():
+            settled_since = None
+            return False
+
+        if settled_since is None:
+            settled_since = time.monotonic()
+        return time.monotonic() - settled_since >= idle_period
+
+    await ops_test.model.block_until(_settled, timeout=timeout)
+
+
+async def build_charm_once(ops_test: OpsTest) -> Path:
+    """Builds the mongos charm once per test session and returns the path to it.
+
+    Set `CHARM_PATH` to use a pre-built charm and skip building entirely.
+    """
+    global _charm_path
+
+    if os.environ.get("CHARM_PATH"):
+        return Path(os.environ["CHARM_PATH"])
+
+    if _charm_path is None or not _charm_path.exists():
+        _charm_path = await ops_test.build_charm(".")
+
+    return _charm_path
+
+
+def charm_source_hash() -> str:
+    """Returns a digest of the files the mongos charm is built from."""
+    digest = hashlib.sha256()
+    paths = [Path("metadata.yaml"), Path("charmcraft.yaml"), Path("config.yaml")]
+    for root in (Path("src"), Path("lib")):
+        paths.extend(path for path in root.rglob("*") if path.is_file())
+
+    for path in sorted(paths):
+        if path.exists():
+            digest.update(str(path).encode())
+            digest.update(path.read_bytes())
+
+    return digest.hexdigest()
+
+
+def charm_with_workload_version(
+    charm: Path, workload_version: str, directory: Path
+) -> Path:
+    """Returns a copy of the charm in `directory` which reports the provided workload version.
+
+    Copies are named after the version and a fingerprint of the source charm, so a copy left in
+    `directory` by a previous run is reused as is. Copies of the version made from another build
+    of the charm are deleted, so that `directory` holds a single copy per version.
+    """
+    charm_stat = charm.stat()
+    source = f"{charm.resolve()}:{charm_stat.st_mtime_ns}:{charm_stat.st_size}"
+    fingerprint = hashlib.blake2b(source.encode(), digest_size=8).hexdigest()
+    version = re.sub(r"[^\w.+-]", "_", workload_version)
+    patched_charm = directory / f"{charm.stem}-{version}-{fingerprint}.charm"
+    if patched_charm.exists():
+        return patched_charm
+
+    for stale_charm in directory.glob(f"{charm.stem}-{version}-*"):
+        stale_charm.unlink(missing_ok=True)
+
+    # patch a temporary copy, so that an interrupted run never leaves a partial charm behind
+    partial_charm = patched_charm.with_suffix(".partial")
+    shutil.copyfile(charm, partial_charm)
+    with zipfile.ZipFile(partial_charm, mode="a") as charm_zip:
+        charm_zip.writestr("workload_version", workload_version)
+    partial_charm.replace(patched_charm)
+
+    return patched_charm
+
+
+def is_related(ops_test: OpsTest, *endpoints: str) -> bool:
+    """Returns True if a relation between the provided `<app>[:<endpoint>]` exists."""
+    return any(relation.matches(*endpoints) for relation in ops_test.model.relations)
+
+
+def is_cluster_deployed(ops_test: OpsTest) -> bool:
+    """Returns True if every cluster component is deployed and active in the model."""
+    for app in (MONGOS_APP_NAME, CONFIG_SERVER_APP_NAME, SHARD_APP_NAME):
+        application = ops_test.model.applications.get(app)
+        if not application or application.status != "active":
+            return False
+
+    return True
+
+
+async def deploy_mongos(
+    ops_test: OpsTest,
+    channel: str | None = None,
+    n_units: int = 1,
+    prebuilt_charm: Optional[Path] = None,
+) -> None:
+    """Deploys the mongos router and waits for idle.
+
+    If mongos is already deployed, it is scaled to `n_units` instead.
+    """
+    application = ops_test.model.applications.get(MONGOS_APP_NAME)
+    if application:
+        if len(application.units) != n_units:
+            await application.scale(n_units)
+        await wait_until_settled(
+            ops_test,
+            apps=[MONGOS_APP_NAME],
+            wait_for_exact_units={MONGOS_APP_NAME: n_units},
+        )
+        return
+
     if channel:
         mongos_charm = MONGOS_APP_NAME
     else:
-        mongos_charm = await ops_test.build_charm(".")
+        mongos_charm = prebuilt_charm or await build_charm_once(ops_test)
     resources = {
-        "mongodb-image": METADATA["resources"]["mongodb-image"]["upstream-source"]
+        "mongodb-image": _metadata()["resources"]["mongodb-image"]["upstream-source"]
     }
     await ops_test.model.deploy(
         mongos_charm,
@@ -186,58 +429,109 @@ async def deploy_cluster_components(
         num_units=n_units,
         trust=True,
     )
-
-    await ops_test.model.deploy(
-        MONGODB_CHARM_NAME,
-        application_name=CONFIG_SERVER_APP_NAME,
-        channel="6/edge",
-        config={"role": "config-server"},
+    await wait_until_settled(
+        ops_test,
+        apps=[MONGOS_APP_NAME],
+        wait_for_exact_units={MONGOS_APP_NAME: n_units},
     )
-    await ops_test.model.deploy(
-        MONGODB_CHARM_NAME,
-        application_name=SHARD_APP_NAME,
-        channel="6/edge",
-        config={"role": "shard"},
+
+
+async def deploy_backing_cluster(ops_test: OpsTest, integrate: bool = False) -> None:
+    """Deploys the config-server and the shard and waits for idle.
+
+    Components which are already deployed are skipped. Set `integrate` to also build the sharded
+    cluster out of them.
+    """
+    await asyncio.gather(
+        *(
+            ops_test.model.deploy(
+                MONGODB_CHARM_NAME,
+                application_name=app_name,
+                channel="6/edge",
+                config={"role": role},
+            )
+            for app_name, role in (
+                (CONFIG_SERVER_APP_NAME, "config-server"),
+                (SHARD_APP_NAME, "shard"),
+            )
+            if app_name not in ops_test.model.applications
+        )
     )
+    await wait_until_settled(ops_test, apps=[SHARD_APP_NAME, CONFIG_SERVER_APP_NAME])
+
+    if integrate:
+        await integrate_sharded_cluster(ops_test)
 
-    await ops_test.model.wait_for_idle(
-        apps=[MONGOS_APP_NAME, SHARD_APP_NAME, CONFIG_SERVER_APP_NAME],
-        idle_period=30,
-        raise_on_blocked=False,
-        raise_on_error=False,  # Removed this once DPE-4996 is resolved.
+
+async def deploy_cluster_components(
+    ops_test: OpsTest,
+    channel: str | None = None,
+    n_units: int = 1,
+    prebuilt_charm: Optional[Path] = None,
+) -> None:
+    """Deploys all cluster components and waits for idle."""
+    await asyncio.gather(
+        deploy_mongos(
+            ops_test, channel=channel, n_units=n_units, prebuilt_charm=prebuilt_charm
+        ),
+        deploy_backing_cluster(ops_test),
     )
 
 
-async def build_cluster(ops_test: OpsTest) -> None:
-    """Builds the cluster by integrating the components."""
-    # prepare sharded cluster
-    await ops_test.model.wait_for_idle(
+SHARDING_RELATION = (
+    f"{SHARD_APP_NAME}:{SHARD_REL_NAME}",
+    f"{CONFIG_SERVER_APP_NAME}:{CONFIG_SERVER_REL_NAME}",
+)
+CLUSTER_RELATION = (
+    f"{MONGOS_APP_NAME}:{CLUSTER_REL_NAME}",
+    f"{CONFIG_SERVER_APP_NAME}:{CLUSTER_REL_NAME}",
+)
+
+
+async def integrate_sharded_cluster(ops_test: OpsTest) -> None:
+    """Integrates the shard with the config-server, unless they are already integrated."""
+    if not is_related(ops_test, *SHARDING_RELATION):
+        await ops_test.model.integrate(*SHARDING_RELATION)
+    await wait_until_settled(
+        ops_test,
         apps=[CONFIG_SERVER_APP_NAME, SHARD_APP_NAME],
-        idle_period=10,
-        raise_on_blocked=False,
-        raise_on_error=False,  # Removed this once DPE-4996 is resolved.
-    )
-    await ops_test.model.integrate(
-        f"{SHARD_APP_NAME}:{SHARD_REL_NAME}",
-        f"{CONFIG_SERVER_APP_NAME}:{CONFIG_SERVER_REL_NAME}",
+        relations=(SHARDING_RELATION,),
     )
-    await ops_test.model.wait_for_idle(
-        apps=[CONFIG_SERVER_APP_NAME, SHARD_APP_NAME],
-        idle_period=20,
-        raise_on_blocked=False,
-        raise_on_error=False,  # https://github.com/canonical/mongodb-k8s-operator/issues/301
+
+
+async def integrate_mongos_with_cluster(ops_test: OpsTest) -> None:
+    """Integrates mongos with the config-server and waits for the cluster to be active.
+
+    The integration is skipped if mongos is already integrated with the config-server.
+    """
+    if not is_related(ops_test, *CLUSTER_RELATION):
+        await ops_test.model.integrate(*CLUSTER_RELATION)
+    await wait_until_settled(
+        ops_test,
+        apps=[CONFIG_SERVER_APP_NAME, SHARD_APP_NAME, MONGOS_APP_NAME],
+        status="active",
+        relations=(CLUSTER_RELATION,),
     )
 
-    # connect sharded cluster to mongos
-    await ops_test.model.integrate(
-        f"{MONGOS_APP_NAME}:{CLUSTER_REL_NAME}",
-        f"{CONFIG_SERVER_APP_NAME}:{CLUSTER_REL_NAME}",
+
+async def build_cluster(ops_test: OpsTest, mongos_units: int = 1) -> None:
+    """Builds the cluster by integrating the components.
+
+    The components are expected to be deployed, see `deploy_cluster_components`. Pass the number
+    of `mongos_units` when mongos was scaled after its deployment.
+    """
+    # the config-server handles its shards and its routers independently, both relations can be
+    # established at once
+    await asyncio.gather(
+        ops_test.model.integrate(*SHARDING_RELATION),
+        ops_test.model.integrate(*CLUSTER_RELATION),
     )
-    await ops_test.model.wait_for_idle(
+    await wait_until_settled(
+        ops_test,
         apps=[CONFIG_SERVER_APP_NAME, SHARD_APP_NAME, MONGOS_APP_NAME],
-        idle_period=20,
         status="active",
-        raise_on_error=False,  # Removed this once DPE-4996 is resolved.
+        relations=(SHARDING_RELATION, CLUSTER_RELATION),
+        wait_for_exact_units={MONGOS_APP_NAME: mongos_units},
     )
 
 
@@ -249,7 +543,7 @@ async def get_application_name(ops_test: OpsTest, application_name: str) -> str:
     Note: if multiple applications with the application name exist, the first one found will be
      returned.
     """
-    status = await ops_test.model.get_status()
+    status = await get_juju_status_json(ops_test)
 
     for application in ops_test.model.applications:
         # note that format of the charm field is not exactly "mongodb" but instead takes the form
@@ -264,7 +558,7 @@ async def get_address_of_unit(
     ops_test: OpsTest, unit_id: int, app_name: str = MONGOS_APP_NAME
 ) -> str:
     """Retrieves the address of the unit based on provided id."""
-    status = await ops_test.model.get_status()
+    status = await get_juju_status_json(ops_test)
     return status["applications"][app_name]["units"][f"{app_name}/{unit_id}"]["address"]
 
 
@@ -303,25 +597,31 @@ async def get_application_relation_data(
             and/or alias.
     """
     unit = ops_test.model.applications[application_name].units[0]
-    raw_data = (await ops_test.juju("show-unit", unit.name))[1]
-    if not raw_data:
-        raise ValueError(f"no unit info could be grabbed for { unit.name}")
-    data = yaml.safe_load(raw_data)
+    # read the unit info over the model connection rather than forking `juju show-unit`
+    application_facade = client.ApplicationFacade.from_connection(
+        ops_test.model.connection()
+    )
+    unit_info = (
+        await application_facade.UnitsInfo(entities=[client.Entity(tag=unit.tag)])
+    ).results[0]
+    if unit_info.error or not unit_info.result:
+        raise ValueError(f"no unit info could be grabbed for {unit.name}")
+
     # Filter the data based on the relation name.
     relation_data = [
-        v for v in data[unit.name]["relation-info"] if v["endpoint"] == relation_name
+        v for v in unit_info.result.relation_data if v.endpoint == relation_name
     ]
 
     if relation_id:
         # Filter the data based on the relation id.
-        relation_data = [v for v in relation_data if v["relation-id"] == relation_id]
+        relation_data = [v for v in relation_data if v.relation_id == relation_id]
 
     if relation_alias:
         # Filter the data based on the cluster/relation alias.
         relation_data = [
             v
             for v in relation_data
-            if json.loads(v["application-data"]["data"])["alias"] == relation_alias
+            if json.loads(v.applicationdata["data"])["alias"] == relation_alias
         ]
 
     if len(relation_data) == 0:
@@ -329,18 +629,44 @@ async def get_application_relation_data(
             f"no relation data could be grabbed on relation with endpoint {relation_name} and alias {relation_alias}"
         )
 
-    return relation_data[0]["application-data"].get(key)
+    return relation_data[0].applicationdata.get(key)
 
 
+@retry(
+    stop=stop_after_delay(60),
+    wait=wait_exponential(multiplier=1, min=1, max=10),
+    retry=retry_if_exception_type((AssertionError, KeyError)),
+    reraise=True,
+)
 async def get_mongos_user_password(
     ops_test: OpsTest, app_name=MONGOS_APP_NAME, relation_name="cluster"
 ) -> Tuple[str, str]:
-    secret_uri = await get_application_relation_data(
-        ops_test, app_name, relation_name=relation_name, key="secret-user"
-    )
+    """Returns the credentials of the user created for the provided relation.
+
+    Credentials are only fetched once per relation, concurrent callers wait on the first fetch.
+    """
+    key = (ops_test.model.name, app_name, relation_name)
+    async with _mongos_credentials_locks.setdefault(key, asyncio.Lock()):
+        if key not in _mongos_credentials:
+            secret_uri = await get_application_relation_data(
+                ops_test, app_name, relation_name=relation_name, key="secret-user"
+            )
+            assert secret_uri, "No secret URI found"
 
-    secret_data = await get_secret_data(ops_test, secret_uri)
-    return secret_data.get("username"), secret_data.get("password")
+            secret_data = await get_secret_data(ops_test, secret_uri)
+            _mongos_credentials[key] = (
+                secret_data.get("username"),
+                secret_data.get("password"),
+            )
+
+    return _mongos_credentials[key]
+
+
+def invalidate_mongos_credentials(
+    ops_test: OpsTest, app_name=MONGOS_APP_NAME, relation_name="cluster"
+) -> None:
+    """Drops the cached credentials, for tests that rotate them."""
+    _mongos_credentials.pop((ops_test.model.name, app_name, relation_name), None)
 
 
 async def check_mongos(
@@ -349,25 +675,59 @@ async def check_mongos(
     auth: bool = True,
     app_name=MONGOS_APP_NAME,
     uri: str = None,
+    fast_fail: bool = False,
+    client: Optional[MongoClient] = None,
 ) -> bool:
-    """Returns True if mongos is running on the provided unit."""
-    mongos_client = await get_direct_mongos_client(
-        ops_test, unit_id, auth, app_name, uri
+    """Returns True if mongos is running on the provided unit.
+
+    Set `fast_fail` when mongos is expected to be unreachable, to give up after a couple seconds.
+    Pass a `client` to ping through it rather than opening (and closing) a new one, in which case
+    the other connection arguments are ignored.
+    """
+    mongos_client = client or await get_direct_mongos_client(
+        ops_test, unit_id, auth, app_name, uri, fast_fail=fast_fail
     )
     try:
-        # wait 10 seconds in case the daemon was just started
-        for attempt in Retrying(stop=stop_after_delay(10)):
+        # wait 10 seconds in case the daemon was just started, only connection errors are worth
+        # retrying
+        async for attempt in AsyncRetrying(
+            stop=stop_after_delay(2 if fast_fail else 10),
+            wait=wait_exponential(multiplier=0.2, max=2),
+            retry=retry_if_exception_type(AutoReconnect),
+        ):
             with attempt:
-                mongos_client.admin.command("ping")
+                # pymongo is blocking, run it off the event loop so units can be checked
+                # concurrently
+                await asyncio.to_thread(mongos_client.admin.command, "ping")
 
-    except RetryError:
+    except (RetryError, PyMongoError):
         return False
     finally:
-        mongos_client.close()
+        if not client:
+            mongos_client.close()
 
     return True
 
 
+async def assert_user_with_extra_roles(
+    ops_test: OpsTest, mongos_client: MongoClient, mongos_host: str
+) -> None:
+    """Creates the test user through the provided client and asserts it can access mongos."""
+    mongos_client.admin.command(
+        "createUser",
+        TEST_USER_NAME,
+        pwd=TEST_USER_PWD,
+        roles=[{"role": "readWrite", "db": TEST_DB_NAME}],
+        mechanisms=["SCRAM-SHA-256"],
+    )
+
+    test_user_uri = (
+        f"mongodb://{TEST_USER_NAME}:{TEST_USER_PWD}@{mongos_host}:{MONGOS_PORT}"
+    )
+    test_user_accessible = await check_mongos(ops_test, uri=test_user_uri)
+    assert test_user_accessible, "User created is not accessible."
+
+
 async def get_mongos_uri(
     ops_test: OpsTest, unit_id: int, auth: bool = True, app_name=MONGOS_APP_NAME
 ):
@@ -386,16 +746,29 @@ async def get_direct_mongos_client(
     auth: bool = True,
     app_name: str = MONGOS_APP_NAME,
     uri: str = None,
+    fast_fail: bool = False,
 ) -> MongoClient:
-    """Returns a direct mongodb client potentially passing over some of the units."""
-    mongos_uri = uri or await get_mongos_uri(ops_test, unit_id, auth, app_name)
-    return MongoClient(mongos_uri, directConnection=True)
+    """Returns a direct mongodb client potentially passing over some of the units.
 
+    Set `fast_fail` when mongos is expected to be unreachable, to time out after 500ms.
+    """
+    mongos_uri = uri or await get_mongos_uri(ops_test, unit_id, auth, app_name)
+    if fast_fail:
+        return MongoClient(
+            mongos_uri,
+            directConnection=True,
+            serverSelectionTimeoutMS=MONGOS_CLIENT_FAST_FAIL_TIMEOUT_MS,
+            connectTimeoutMS=MONGOS_CLIENT_FAST_FAIL_TIMEOUT_MS,
+            socketTimeoutMS=MONGOS_CLIENT_FAST_FAIL_TIMEOUT_MS,
+        )
 
-def get_juju_status(model_name: str, app_name: str) -> str:
-    return subprocess.check_output(
-        f"juju status --model {model_name} {app_name}".split()
-    ).decode("utf-8")
+    return MongoClient(
+        mongos_uri,
+        directConnection=True,
+        serverSelectionTimeoutMS=MONGOS_CLIENT_TIMEOUT_MS,
+        connectTimeoutMS=MONGOS_CLIENT_TIMEOUT_MS,
+        socketTimeoutMS=MONGOS_CLIENT_SOCKET_TIMEOUT_MS,
+    )
 
 
 async def get_workload_version(ops_test: OpsTest, unit_name: str) -> str:
@@ -2,31 +2,28 @@
 # Copyright 2024 Canonical Ltd.
 # See LICENSE file for licensing details.
 
+import asyncio
 
 import pytest
 from pytest_operator.plugin import OpsTest
 
 from .helpers import (
+    assert_user_with_extra_roles,
     build_cluster,
     check_mongos,
-    get_direct_mongos_client,
     get_address_of_unit,
+    invalidate_juju_status_cache,
     wait_for_mongos_units_blocked,
     MONGOS_APP_NAME,
-    MONGOS_PORT,
     deploy_cluster_components,
 )
 
-TEST_USER_NAME = "TestUserName1"
-TEST_USER_PWD = "Test123"
-TEST_DB_NAME = "my-test-db"
-
 
 @pytest.mark.group(1)
 @pytest.mark.abort_on_fail
-async def test_build_and_deploy(ops_test: OpsTest):
+async def test_build_and_deploy(ops_test: OpsTest, built_charm):
     """Build and deploy a sharded cluster."""
-    await deploy_cluster_components(ops_test)
+    await deploy_cluster_components(ops_test, prebuilt_charm=built_charm)
 
 
 @pytest.mark.group(1)
@@ -54,31 +51,16 @@ async def test_mongos_starts_with_config_server(ops_test: OpsTest) -> None:
 
 @pytest.mark.group(1)
 @pytest.mark.abort_on_fail
-async def test_mongos_has_user(ops_test: OpsTest) -> None:
-    mongos_running = await check_mongos(ops_test, unit_id=0, auth=True)
+async def test_mongos_has_user(ops_test: OpsTest, mongos_client) -> None:
+    mongos_running = await check_mongos(ops_test, client=mongos_client)
     assert mongos_running, "Mongos is not currently running."
 
 
 @pytest.mark.group(1)
 @pytest.mark.abort_on_fail
-async def test_user_with_extra_roles(ops_test: OpsTest) -> None:
-    mongos_client = await get_direct_mongos_client(
-        ops_test, unit_id=0, auth=True, app_name=MONGOS_APP_NAME
-    )
-    mongos_client.admin.command(
-        "createUser",
-        TEST_USER_NAME,
-        pwd=TEST_USER_PWD,
-        roles=[{"role": "readWrite", "db": TEST_DB_NAME}],
-        mechanisms=["SCRAM-SHA-256"],
-    )
-    mongos_client.close()
+async def test_user_with_extra_roles(ops_test: OpsTest, mongos_client) -> None:
     mongos_host = await get_address_of_unit(ops_test, unit_id=0)
-    test_user_uri = (
-        f"mongodb://{TEST_USER_NAME}:{TEST_USER_PWD}@{mongos_host}:{MONGOS_PORT}"
-    )
-    mongos_running = await check_mongos(ops_test, uri=test_user_uri)
-    assert mongos_running, "User created is not accessible."
+    await assert_user_with_extra_roles(ops_test, mongos_client, mongos_host)
 
 
 @pytest.mark.group(1)
@@ -92,7 +74,14 @@ async def test_mongos_can_scale(ops_test: OpsTest) -> None:
         status="active",
         timeout=1000,
     )
-
-    for unit_id in range(0, len(ops_test.model.applications[MONGOS_APP_NAME].units)):
-        mongos_running = await check_mongos(ops_test, unit_id=unit_id, auth=True)
-        assert mongos_running, "Mongos is not currently running."
+    # the new unit is not part of any status cached before scaling
+    invalidate_juju_status_cache()
+
+    n_units = len(ops_test.model.applications[MONGOS_APP_NAME].units)
+    mongos_running = await asyncio.gather(
+        *(
+            check_mongos(ops_test, unit_id=unit_id, auth=True)
+            for unit_id in range(n_units)
+        )
+    )
+    assert all(mongos_running), "Mongos is not currently running."
@@ -2,17 +2,28 @@
 # Copyright 2024 Canonical Ltd.
 # See LICENSE file for licensing details.
 
-from pathlib import Path
+import asyncio
 from pytest_operator.plugin import OpsTest
 from ..helpers import get_application_relation_data
-from tenacity import RetryError, Retrying, stop_after_attempt, wait_exponential
-from datetime import datetime
-from typing import Optional, Dict
+from tenacity import (
+    AsyncRetrying,
+    RetryError,
+    stop_after_attempt,
+    stop_after_delay,
+    wait_exponential,
+    wait_fixed,
+)
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional, Dict, List, Tuple
+import base64
+import io
 import json
 import ops
 import logging
+import tarfile
 import time
 from ops.model import Unit
+from pymongo.uri_parser import parse_uri
 from ..client_relations.helpers import get_external_uri
 from ..helpers import get_mongos_uri
 
@@ -22,7 +33,6 @@ logger = logging.getLogger(__name__)
 EXTERNAL_PEM_PATH = "/etc/mongod/external-cert.pem"
 EXTERNAL_CERT_PATH = "/etc/mongod/external-ca.crt"
 INTERNAL_CERT_PATH = "/etc/mongod/internal-ca.crt"
-MONGO_SHELL = "/usr/bin/mongosh"
 MONGOS_APP_NAME = "mongos-k8s"
 CERT_REL_NAME = "certificates"
 CERTS_APP_NAME = "self-signed-certificates"
@@ -32,6 +42,12 @@ SHARD_APP_NAME = "shard0"
 CLUSTER_COMPONENTS = [CONFIG_SERVER_APP_NAME, SHARD_APP_NAME]
 MONGOS_SERVICE = "mongos.service"
 PEBBLE_TIME_UNIT = 60
+TIMEOUT = 15 * 60
+
+# client URIs only change with the exposure of mongos, cache them per (model, unit, internal)
+_mongos_uris: Dict[Tuple[str, str, bool], str] = {}
+# SANs of the internal and external certificates per (model, unit), keyed by internal
+_sans_ips: Dict[Tuple[str, str], Dict[bool, str]] = {}
 
 
 class ProcessError(Exception):
@@ -60,11 +76,15 @@ async def integrate_mongos_with_tls(ops_test: OpsTest) -> None:
 
 async def integrate_cluster_with_tls(ops_test: OpsTest) -> None:
     """Integrate cluster components to the TLS interface."""
-    for cluster_component in CLUSTER_COMPONENTS:
-        await ops_test.model.integrate(
-            f"{cluster_component}:{CERT_REL_NAME}",
-            f"{CERTS_APP_NAME}:{CERT_REL_NAME}",
+    await asyncio.gather(
+        *(
+            ops_test.model.integrate(
+                f"{cluster_component}:{CERT_REL_NAME}",
+                f"{CERTS_APP_NAME}:{CERT_REL_NAME}",
+            )
+            for cluster_component in CLUSTER_COMPONENTS
         )
+    )
 
     await ops_test.model.wait_for_idle(
         apps=CLUSTER_COMPONENTS,
@@ -74,22 +94,51 @@ async def integrate_cluster_with_tls(ops_test: OpsTest) -> None:
     )
 
 
-async def check_mongos_tls_disabled(ops_test: OpsTest) -> None:
-    # check mongos is running with TLS enabled
-    for unit in ops_test.model.applications[MONGOS_APP_NAME].units:
-        await check_tls(ops_test, unit, enabled=False)
+async def wait_until(
+    predicate: Callable[[], Awaitable[bool]], interval: int = 2, timeout: int = TIMEOUT
+) -> None:
+    """Polls the provided predicate until it holds, rather than waiting for a fixed period."""
+    async for attempt in AsyncRetrying(
+        stop=stop_after_delay(timeout), wait=wait_fixed(interval), reraise=True
+    ):
+        with attempt:
+            assert await predicate(), "condition not met before timeout"
+
+
+async def check_mongos_tls_disabled(ops_test: OpsTest) -> bool:
+    """Returns True if all mongos units run with TLS disabled."""
+    results = await asyncio.gather(
+        *(
+            check_tls(ops_test, unit, enabled=False)
+            for unit in ops_test.model.applications[MONGOS_APP_NAME].units
+        )
+    )
+    return all(results)
 
 
-async def check_mongos_tls_enabled(ops_test: OpsTest, internal=True) -> None:
+async def check_mongos_tls_enabled(ops_test: OpsTest, internal=True) -> bool:
+    """Returns True if all mongos units run with TLS enabled."""
     # check each replica set is running with TLS enabled
-    for unit in ops_test.model.applications[MONGOS_APP_NAME].units:
-        await check_tls(ops_test, unit, enabled=True, internal=internal)
+    results = await asyncio.gather(
+        *(
+            check_tls(ops_test, unit, enabled=True, internal=internal)
+            for unit in ops_test.model.applications[MONGOS_APP_NAME].units
+        )
+    )
+    return all(results)
+
+
+def invalidate_mongos_uris() -> None:
+    """Drops the cached client URIs, for callers that change how mongos is exposed."""
+    _mongos_uris.clear()
 
 
 async def toggle_tls_mongos(
     ops_test: OpsTest, enable: bool, certs_app_name: str = CERTS_APP_NAME
 ) -> None:
     """Toggles TLS on mongos application to the specified enabled state."""
+    invalidate_mongos_uris()
+    invalidate_sans_ips()
     if enable:
         await ops_test.model.integrate(
             f"{MONGOS_APP_NAME}:{CERT_REL_NAME}",
@@ -105,24 +154,28 @@ async def toggle_tls_mongos(
 
 
 async def mongos_tls_command(ops_test: OpsTest, unit, internal=True) -> str:
-    """Generates a command which verifies TLS status."""
+    """Generates a command which verifies TLS status with a TLS handshake with mongos."""
     unit_id = unit.name.split("/")[1]
-    if not internal:
-        client_uri = await get_external_uri(ops_test, unit_id=unit_id)
-    else:
-        client_uri = await get_mongos_uri(ops_test, unit_id=unit_id)
+    key = (ops_test.model.name, unit_id, internal)
+    if key not in _mongos_uris:
+        if not internal:
+            _mongos_uris[key] = await get_external_uri(ops_test, unit_id=unit_id)
+        else:
+            _mongos_uris[key] = await get_mongos_uri(ops_test, unit_id=unit_id)
+
+    client_uri = _mongos_uris[key]
 
+    host, port = parse_uri(client_uri)["nodelist"][0]
     return (
-        f"{MONGO_SHELL} '{client_uri}'  --eval 'db.getUsers()'"
-        f" --tls --tlsCAFile {EXTERNAL_CERT_PATH}"
-        f" --tlsCertificateKeyFile {EXTERNAL_PEM_PATH}"
+        f"openssl s_client -connect {host}:{port} -brief -verify_return_error"
+        f" -CAfile {EXTERNAL_CERT_PATH} -cert {EXTERNAL_PEM_PATH} </dev/null"
     )
 
 
-async def check_tls(ops_test, unit, enabled, internal=True) -> None:
+async def check_tls(ops_test, unit, enabled, internal=True) -> bool:
     """Returns True if TLS matches the expected state "enabled"."""
     try:
-        for attempt in Retrying(
+        async for attempt in AsyncRetrying(
             stop=stop_after_attempt(10),
             wait=wait_exponential(multiplier=1, min=2, max=30),
         ):
@@ -147,32 +200,29 @@ async def check_tls(ops_test, unit, enabled, internal=True) -> None:
 
 
 async def get_sans_ips(ops_test: OpsTest, unit: Unit, internal: bool) -> str:
-    """Retrieves the sans for the for mongos on the provided unit."""
-    cert_name = "internal" if internal else "external"
-    get_sans_cmd = (
-        f"openssl x509 -noout -ext subjectAltName -in /etc/mongod/{cert_name}-cert.pem"
-    )
-    complete_command = f"ssh --container mongos {unit.name} {get_sans_cmd}"
-    _, result, _ = await ops_test.juju(*complete_command.split())
-    return result
+    """Retrieves the sans for the for mongos on the provided unit.
 
+    The SANs of both certificates are read in one remote session and cached until
+    invalidate_sans_ips is called.
+    """
+    key = (ops_test.model.name, unit.name)
+    if key not in _sans_ips:
+        get_sans_cmd = (
+            "openssl x509 -noout -ext subjectAltName -in /etc/mongod/internal-cert.pem;"
+            " echo ---;"
+            " openssl x509 -noout -ext subjectAltName -in /etc/mongod/external-cert.pem"
+        )
+        complete_command = f"ssh --container mongos {unit.name} {get_sans_cmd}"
+        _, result, _ = await ops_test.juju(*complete_command.split())
+        internal_sans, _, external_sans = result.partition("---")
+        _sans_ips[key] = {True: internal_sans, False: external_sans}
 
-async def time_file_created(ops_test: OpsTest, unit_name: str, path: str) -> int:
-    """Returns the unix timestamp of when a file was created on a specified unit."""
-    time_cmd = f"ls -l --time-style=full-iso {path} "
-    complete_command = f"ssh --container mongos {unit_name} {time_cmd}"
-    return_code, ls_output, stderr = await ops_test.juju(*complete_command.split())
+    return _sans_ips[key][internal]
 
-    if return_code != 0:
-        logger.error(stderr)
-        raise ProcessError(
-            "Expected time command %s to succeed instead it failed: %s; %s",
-            time_cmd,
-            return_code,
-            stderr,
-        )
 
-    return process_ls_time(ls_output)
+def invalidate_sans_ips() -> None:
+    """Drops the cached SANs, for callers that change how mongos is exposed."""
+    _sans_ips.clear()
 
 
 async def time_process_started(
@@ -217,22 +267,33 @@ def process_pebble_time(changes_output):
 async def check_certs_correctly_distributed(
     ops_test: OpsTest,
     unit: ops.Unit,
-    tmpdir: Path,
     app_name: str | None = None,
+    cert_contents: Dict[str, str] | None = None,
+    secret_content: Dict[str, str] | None = None,
+    certificates_raw_data: str | None = None,
 ) -> None:
     """Comparing expected vs distributed certificates.
 
-    Verifying certificates downloaded on the charm against the ones distributed by the TLS operator
+    Verifying certificates downloaded on the charm against the ones distributed by the TLS
+    operator. Certificates already read from the unit can be provided in cert_contents, keyed by
+    path, to avoid reading them again. Likewise, the unit secret and the certificates relation
+    data can be provided in secret_content and certificates_raw_data.
     """
     app_name = app_name
-    unit_secret_id = await get_secret_id(ops_test, unit.name)
-    unit_secret_content = await get_secret_content(ops_test, unit_secret_id)
+    unit_secret_content = secret_content
+    if unit_secret_content is None:
+        unit_secret_id = await get_secret_id(ops_test, unit.name)
+        unit_secret_content = await get_secret_content(ops_test, unit_secret_id)
 
     # Get the values for certs from the relation, as provided by TLS Charm
-    certificates_raw_data = await get_application_relation_data(
-        ops_test, app_name, CERT_REL_NAME, "certificates"
-    )
+    if certificates_raw_data is None:
+        certificates_raw_data = await get_application_relation_data(
+            ops_test, app_name, CERT_REL_NAME, "certificates"
+        )
     certificates_data = json.loads(certificates_raw_data)
+    certificates_by_csr = {
+        data["certificate_signing_request"].rstrip(): data for data in certificates_data
+    }
 
     # compare the TLS resources stored on the disk of the unit with the ones from the TLS relation
     for cert_type, cert_path in [
@@ -240,16 +301,16 @@ async def check_certs_correctly_distributed(
         ("ext", EXTERNAL_CERT_PATH),
     ]:
         unit_csr = unit_secret_content[f"{cert_type}-csr-secret"]
-        tls_item = [
-            data
-            for data in certificates_data
-            if data["certificate_signing_request"].rstrip() == unit_csr.rstrip()
-        ][0]
+        tls_item = certificates_by_csr.get(unit_csr.rstrip())
+        assert (
+            tls_item
+        ), f"No certificate provided for the {cert_type} CSR of {unit.name}."
 
         # Read the content of the cert file stored in the unit
-        cert_file_content = await get_file_content(
-            ops_test, unit.name, cert_path, tmpdir
-        )
+        if cert_contents and cert_path in cert_contents:
+            cert_file_content = cert_contents[cert_path]
+        else:
+            cert_file_content = await get_file_content(ops_test, unit.name, cert_path)
 
         # Get the external cert value from the relation
         relation_cert = "\n".join(tls_item["chain"]).strip()
@@ -260,51 +321,55 @@ async def check_certs_correctly_distributed(
         ), f"Relation Content for {cert_type}-cert:\n{relation_cert}\nFile Content:\n{cert_file_content}\nMismatch."
 
 
-async def scp_file_preserve_ctime(
-    ops_test: OpsTest, unit_name: str, path: str, tmpdir: Path
-) -> int:
-    """Returns the unix timestamp of when a file was created on a specified unit."""
-    # Retrieving the file
-    filename = tmpdir / Path(path.split("/")[-1])
-    complete_command = f"scp --container mongos {unit_name}:{path} {filename}"
-    return_code, _, stderr = await ops_test.juju(*complete_command.split())
+async def fetch_cert_bundle(
+    ops_test: OpsTest, unit_name: str, paths: List[str]
+) -> Dict[str, Tuple[str, datetime]]:
+    """Returns the contents and modification times of the provided files on a unit.
+
+    All files are fetched in one remote session, as a base64 encoded tarball.
+    """
+    # posix format keeps sub-second modification times
+    relative_paths = " ".join(path.lstrip("/") for path in paths)
+    tar_cmd = f"tar -cf - --format=posix -C / {relative_paths} | base64 -w0"
+    complete_command = f"ssh --container mongos {unit_name} {tar_cmd}"
+    return_code, stdout, stderr = await ops_test.juju(*complete_command.split())
 
     if return_code != 0:
         logger.error(stderr)
         raise ProcessError(
             "Expected command %s to succeed instead it failed: %s; %s",
-            complete_command,
+            tar_cmd,
             return_code,
             stderr,
         )
 
-    return f"{filename}"
+    bundle = {}
+    with tarfile.open(fileobj=io.BytesIO(base64.b64decode(stdout.strip()))) as tar:
+        for member in tar.getmembers():
+            bundle[f"/{member.name}"] = (
+                tar.extractfile(member).read().decode(),
+                datetime.fromtimestamp(member.mtime, tz=timezone.utc),
+            )
 
+    return bundle
 
-async def get_file_content(
-    ops_test: OpsTest, unit_name: str, path: str, tmpdir: Path
-) -> str:
-    filename = await scp_file_preserve_ctime(ops_test, unit_name, path, tmpdir)
 
-    with open(filename, mode="r") as fd:
-        return fd.read()
-
-
-def process_ls_time(ls_output):
-    """Parse time representation as returned by the 'ls' command."""
-    time_as_str = "T".join(ls_output.split("\n")[0].split(" ")[5:7])
-    # further strip down additional milliseconds
-    time_as_str = time_as_str[0:-3]
-    d = datetime.strptime(time_as_str, "%Y-%m-%dT%H:%M:%S.%f")
-    return d
+async def get_file_content(ops_test: OpsTest, unit_name: str, path: str) -> str:
+    """Returns the contents of a file on a unit, streamed over stdout."""
+    return_code, stdout, stderr = await ops_test.juju(
+        "ssh", "--container", "mongos", unit_name, "cat", path
+    )
 
+    if return_code != 0:
+        logger.error(stderr)
+        raise ProcessError(
+            "Expected command %s to succeed instead it failed: %s; %s",
+            f"cat {path}",
+            return_code,
+            stderr,
+        )
 
-def process_systemctl_time(systemctl_output):
-    """Parse time representation as returned by the 'systemctl' command."""
-    "ActiveEnterTimestamp=Thu 2022-09-22 10:00:00 UTC"
-    time_as_str = "T".join(systemctl_output.split("=")[1].split(" ")[1:3])
-    d = datetime.strptime(time_as_str, "%Y-%m-%dT%H:%M:%S")
-    return d
+    return stdout
 
 
 async def get_secret_id(ops_test, app_or_unit: Optional[str] = None) -> str:
@@ -335,36 +400,78 @@ async def get_secret_content(ops_test, secret_id) -> Dict[str, str]:
     return data[secret_id]["content"]["Data"]
 
 
-async def get_file_contents(ops_test: OpsTest, unit: str, filepath: str) -> str:
-    """Returns the contents of the provided filepath."""
-    mv_cmd = f"exec --unit {unit.name} sudo cat {filepath} "
-    _, stdout, _ = await ops_test.juju(*mv_cmd.split())
-    return stdout
+async def load_all_unit_secrets(ops_test, app: str) -> Dict[str, Dict[str, str]]:
+    """Retrieve the contents of the Juju Secrets owned by each unit of an app."""
+    _, stdout, _ = await ops_test.juju("list-secrets", "--format=json")
+    unit_secret_ids = {}
+    for secret_id, secret in json.loads(stdout).items():
+        owner = secret.get("owner", "")
+        if owner.startswith(f"{app}/"):
+            unit_secret_ids.setdefault(owner, secret_id)
 
+    contents = await asyncio.gather(
+        *(
+            get_secret_content(ops_test, secret_id)
+            for secret_id in unit_secret_ids.values()
+        )
+    )
+    return dict(zip(unit_secret_ids, contents))
 
-async def rotate_and_verify_certs(ops_test: OpsTest, app: str, tmpdir: Path) -> None:
+
+async def rotate_and_verify_certs(ops_test: OpsTest, app: str) -> None:
     """Verify provided app can rotate its TLS certs."""
-    original_tls_info = {}
-    for unit in ops_test.model.applications[app].units:
-        original_tls_info[unit.name] = {}
-        original_tls_info[unit.name]["external_cert_contents"] = await get_file_content(
-            ops_test, unit.name, EXTERNAL_CERT_PATH, tmpdir
-        )
-        original_tls_info[unit.name]["internal_cert_contents"] = await get_file_content(
-            ops_test, unit.name, INTERNAL_CERT_PATH, tmpdir
-        )
-        original_tls_info[unit.name]["external_cert"] = await time_file_created(
-            ops_test, unit.name, EXTERNAL_CERT_PATH
-        )
-        original_tls_info[unit.name]["internal_cert"] = await time_file_created(
-            ops_test, unit.name, INTERNAL_CERT_PATH
+
+    async def _get_tls_info(
+        unit: ops.Unit, secret_content: Dict[str, str], certificates_raw_data: str
+    ) -> Dict:
+        async def _fetch_and_check_certs() -> Dict[str, Tuple[str, datetime]]:
+            cert_bundle = await fetch_cert_bundle(
+                ops_test, unit.name, [EXTERNAL_CERT_PATH, INTERNAL_CERT_PATH]
+            )
+            # reuse the certificates just fetched rather than copying them again
+            await check_certs_correctly_distributed(
+                ops_test,
+                unit,
+                app_name=app,
+                cert_contents={
+                    path: contents for path, (contents, _) in cert_bundle.items()
+                },
+                secret_content=secret_content,
+                certificates_raw_data=certificates_raw_data,
+            )
+            return cert_bundle
+
+        cert_bundle, mongos_service = await asyncio.gather(
+            _fetch_and_check_certs(),
+            time_process_started(ops_test, unit.name, MONGOS_SERVICE),
         )
-        original_tls_info[unit.name]["mongos_service"] = await time_process_started(
-            ops_test, unit.name, MONGOS_SERVICE
+        external_cert_contents, external_cert = cert_bundle[EXTERNAL_CERT_PATH]
+        internal_cert_contents, internal_cert = cert_bundle[INTERNAL_CERT_PATH]
+        return {
+            "external_cert_contents": external_cert_contents,
+            "internal_cert_contents": internal_cert_contents,
+            "external_cert": external_cert,
+            "internal_cert": internal_cert,
+            "mongos_service": mongos_service,
+        }
+
+    async def _get_all_tls_info() -> Dict[str, Dict]:
+        units = ops_test.model.applications[app].units
+        # the CSRs and certificates change on rotation, so they are loaded again on every call.
+        # The relation data is shared by all units of the app, it is only read once per call
+        unit_secrets, certificates_raw_data = await asyncio.gather(
+            load_all_unit_secrets(ops_test, app),
+            get_application_relation_data(ops_test, app, CERT_REL_NAME, "certificates"),
         )
-        await check_certs_correctly_distributed(
-            ops_test, unit, app_name=app, tmpdir=tmpdir
+        tls_info = await asyncio.gather(
+            *(
+                _get_tls_info(unit, unit_secrets[unit.name], certificates_raw_data)
+                for unit in units
+            )
         )
+        return {unit.name: info for unit, info in zip(units, tls_info)}
+
+    original_tls_info = await _get_all_tls_info()
 
     time.sleep(PEBBLE_TIME_UNIT)
 
@@ -374,54 +481,42 @@ async def rotate_and_verify_certs(ops_test: OpsTest, app: str, tmpdir: Path) ->
         action = await action.wait()
         assert action.status == "completed", "setting external and internal key failed."
 
-    # wait for certificate to be available and processed. Can get receive two certificate
-    # available events and restart twice so we want to ensure we are idle for at least 1 minute
+    # wait for certificate to be available and processed.
     await ops_test.model.wait_for_idle(
-        apps=[app], status="active", timeout=1000, idle_period=60
+        apps=[app], status="active", timeout=1000, idle_period=5
     )
 
     # After updating both the external key and the internal key a new certificate request will be
-    # made; then the certificates should be available and updated.
-    for unit in ops_test.model.applications[app].units:
-        new_external_cert = await get_file_content(
-            ops_test, unit.name, EXTERNAL_CERT_PATH, tmpdir
-        )
-        new_internal_cert = await get_file_content(
-            ops_test, unit.name, INTERNAL_CERT_PATH, tmpdir
-        )
-        new_external_cert_time = await time_file_created(
-            ops_test, unit.name, EXTERNAL_CERT_PATH
-        )
-        new_internal_cert_time = await time_file_created(
-            ops_test, unit.name, INTERNAL_CERT_PATH
-        )
-        new_mongos_service_time = await time_process_started(
-            ops_test, unit.name, MONGOS_SERVICE
-        )
-
-        await check_certs_correctly_distributed(
-            ops_test, unit, app_name=app, tmpdir=tmpdir
-        )
-        assert (
-            new_external_cert != original_tls_info[unit.name]["external_cert_contents"]
-        ), "external cert not rotated"
-
-        assert (
-            new_internal_cert != original_tls_info[unit.name]["external_cert_contents"]
-        ), "external cert not rotated"
-        assert (
-            new_external_cert_time > original_tls_info[unit.name]["external_cert"]
-        ), f"external cert for {unit.name} was not updated."
-        assert (
-            new_internal_cert_time > original_tls_info[unit.name]["internal_cert"]
-        ), f"internal cert for {unit.name} was not updated."
-
-        # Once the certificate requests are processed and updated the .service file should be
-        # restarted
-        assert (
-            new_mongos_service_time > original_tls_info[unit.name]["mongos_service"]
-        ), f"mongos service for {unit.name} was not restarted."
+    # made; then the certificates should be available and updated. The units can settle before
+    # the new certificates are written, so the comparison is retried until it holds.
+    async for attempt in AsyncRetrying(
+        stop=stop_after_delay(TIMEOUT), wait=wait_fixed(5), reraise=True
+    ):
+        with attempt:
+            new_tls_info = await _get_all_tls_info()
+            for unit_name, new_info in new_tls_info.items():
+                original_info = original_tls_info[unit_name]
+                assert (
+                    new_info["external_cert_contents"]
+                    != original_info["external_cert_contents"]
+                ), "external cert not rotated"
+
+                assert (
+                    new_info["internal_cert_contents"]
+                    != original_info["internal_cert_contents"]
+                ), "internal cert not rotated"
+                assert (
+                    new_info["external_cert"] > original_info["external_cert"]
+                ), f"external cert for {unit_name} was not updated."
+                assert (
+                    new_info["internal_cert"] > original_info["internal_cert"]
+                ), f"internal cert for {unit_name} was not updated."
+
+                # Once the certificate requests are processed and updated the .service file
+                # should be restarted
+                assert (
+                    new_info["mongos_service"] > original_info["mongos_service"]
+                ), f"mongos service for {unit_name} was not restarted."
 
     # Verify that TLS is functioning on all units.
-    for unit in ops_test.model.applications[MONGOS_APP_NAME].units:
-        await check_mongos_tls_enabled(ops_test)
+    assert await check_mongos_tls_enabled(ops_test), "TLS is not enabled on all units."
@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 # Copyright 2024 Canonical Ltd.
 # See LICENSE file for licensing details.
-from pathlib import Path
+import asyncio
+from typing import List
 import pytest
 from pytest_operator.plugin import OpsTest
 from ..helpers import (
@@ -20,12 +21,12 @@ from .helpers import (
     CERTS_APP_NAME,
     rotate_and_verify_certs,
     get_sans_ips,
+    invalidate_mongos_uris,
+    invalidate_sans_ips,
+    wait_until,
 )
 from ..client_relations.helpers import get_public_k8s_ip
 
-MONGOS_SERVICE = "mongos.service"
-
-MONGOS_SERVICE = "snap.charmed-mongodb.mongos.service"
 APPLICATION_APP_NAME = "application"
 MONGODB_CHARM_NAME = "mongodb"
 SHARD_APP_NAME = "shard"
@@ -38,13 +39,13 @@ TIMEOUT = 15 * 60
 
 @pytest.mark.group(1)
 @pytest.mark.abort_on_fail
-async def test_build_and_deploy(ops_test: OpsTest) -> None:
+async def test_build_and_deploy(ops_test: OpsTest, built_charm) -> None:
     """Build and deploy a sharded cluster."""
-    await deploy_cluster_components(ops_test)
+    await deploy_cluster_components(ops_test, prebuilt_charm=built_charm)
     # we should verify that tests work with multiple routers.
     await ops_test.model.applications[MONGOS_APP_NAME].scale(2)
-    await build_cluster(ops_test)
-    await deploy_tls(ops_test)
+    # the TLS operator does not depend on the cluster, deploy it while the cluster is built
+    await asyncio.gather(build_cluster(ops_test, mongos_units=2), deploy_tls(ops_test))
 
 
 @pytest.mark.group(1)
@@ -63,12 +64,12 @@ async def test_mongos_tls_enabled(ops_test: OpsTest) -> None:
     await integrate_cluster_with_tls(ops_test)
     await ops_test.model.wait_for_idle(
         apps=[MONGOS_APP_NAME],
-        idle_period=30,
+        idle_period=5,
         status="active",
         timeout=TIMEOUT,
     )
 
-    await check_mongos_tls_enabled(ops_test)
+    assert await check_mongos_tls_enabled(ops_test), "TLS is not enabled on all units."
 
 
 @pytest.mark.group(1)
@@ -79,48 +80,64 @@ async def test_mongos_tls_nodeport(ops_test: OpsTest):
     await ops_test.model.applications[MONGOS_APP_NAME].set_config(
         {"expose-external": "nodeport"}
     )
+    invalidate_mongos_uris()
+    invalidate_sans_ips()
 
     await ops_test.model.wait_for_idle(
         apps=[MONGOS_APP_NAME],
-        idle_period=60,
+        idle_period=5,
         status="active",
         timeout=TIMEOUT,
     )
     for internal in [True, False]:
-        await check_mongos_tls_enabled(ops_test, internal)
+        assert await check_mongos_tls_enabled(
+            ops_test, internal
+        ), "TLS is not enabled on all units."
+
+    # check for expected IP addresses in the pem file, the certificate is only reissued after
+    # the units settle so the SANs are read again on every attempt
+    public_k8s_ip = await get_public_k8s_ip()
+
+    async def _public_ip_in_sans() -> bool:
+        invalidate_sans_ips()
+        return all(
+            public_k8s_ip in sans_ips for sans_ips in await get_all_sans_ips(ops_test)
+        )
 
-    # check for expected IP addresses in the pem file
-    for unit in ops_test.model.applications[MONGOS_APP_NAME].units:
-        assert get_public_k8s_ip() in await get_sans_ips(ops_test, unit, internal=True)
-        assert get_public_k8s_ip() in await get_sans_ips(ops_test, unit, internal=False)
+    await wait_until(_public_ip_in_sans)
 
     # test that charm can disable nodeport without breaking mongos or accidentally disabling TLS
     await ops_test.model.applications[MONGOS_APP_NAME].set_config(
         {"expose-external": "none"}
     )
+    invalidate_mongos_uris()
+    invalidate_sans_ips()
     await ops_test.model.wait_for_idle(
         apps=[MONGOS_APP_NAME],
-        idle_period=60,
+        idle_period=5,
         status="active",
         timeout=TIMEOUT,
     )
 
-    await check_mongos_tls_enabled(ops_test, internal=True)
+    assert await check_mongos_tls_enabled(
+        ops_test, internal=True
+    ), "TLS is not enabled on all units."
 
     # check for no public k8s IP address in the pem file
-    for unit in ops_test.model.applications[MONGOS_APP_NAME].units:
-        assert get_public_k8s_ip() not in await get_sans_ips(
-            ops_test, unit, internal=True
-        )
-        assert get_public_k8s_ip() not in await get_sans_ips(
-            ops_test, unit, internal=False
+    async def _public_ip_not_in_sans() -> bool:
+        invalidate_sans_ips()
+        return all(
+            public_k8s_ip not in sans_ips
+            for sans_ips in await get_all_sans_ips(ops_test)
         )
 
+    await wait_until(_public_ip_not_in_sans)
+
 
 @pytest.mark.group(1)
 @pytest.mark.abort_on_fail
-async def test_mongos_rotate_certs(ops_test: OpsTest, tmp_path: Path) -> None:
-    await rotate_and_verify_certs(ops_test, MONGOS_APP_NAME, tmpdir=tmp_path)
+async def test_mongos_rotate_certs(ops_test: OpsTest) -> None:
+    await rotate_and_verify_certs(ops_test, MONGOS_APP_NAME)
 
 
 @pytest.mark.group(1)
@@ -136,7 +153,7 @@ async def test_mongos_tls_disabled(ops_test: OpsTest) -> None:
         timeout=300,
     )
 
-    await check_mongos_tls_disabled(ops_test)
+    assert await check_mongos_tls_disabled(ops_test), "TLS is enabled on some units."
 
 
 @pytest.mark.group(1)
@@ -145,31 +162,36 @@ async def test_tls_reenabled(ops_test: OpsTest) -> None:
     """Test that mongos can enable TLS after being integrated to cluster ."""
     await toggle_tls_mongos(ops_test, enable=True)
 
-    await check_mongos_tls_enabled(ops_test)
+    assert await check_mongos_tls_enabled(ops_test), "TLS is not enabled on all units."
 
 
 @pytest.mark.group(1)
 @pytest.mark.abort_on_fail
 async def test_mongos_tls_ca_mismatch(ops_test: OpsTest) -> None:
     """Tests that mongos charm can disable TLS."""
-    await toggle_tls_mongos(ops_test, enable=False)
 
-    await wait_for_mongos_units_blocked(
-        ops_test,
-        MONGOS_APP_NAME,
-        status="mongos requires TLS to be enabled.",
-        timeout=300,
-    )
+    async def _disable_tls() -> None:
+        await toggle_tls_mongos(ops_test, enable=False)
+        await wait_for_mongos_units_blocked(
+            ops_test,
+            MONGOS_APP_NAME,
+            status="mongos requires TLS to be enabled.",
+            timeout=300,
+        )
 
-    await ops_test.model.deploy(
-        CERTS_APP_NAME, application_name=DIFFERENT_CERTS_APP_NAME, channel="stable"
-    )
-    await ops_test.model.wait_for_idle(
-        apps=[DIFFERENT_CERTS_APP_NAME],
-        idle_period=10,
-        raise_on_blocked=False,
-        timeout=TIMEOUT,
-    )
+    async def _deploy_different_certs() -> None:
+        await ops_test.model.deploy(
+            CERTS_APP_NAME, application_name=DIFFERENT_CERTS_APP_NAME, channel="stable"
+        )
+        await ops_test.model.wait_for_idle(
+            apps=[DIFFERENT_CERTS_APP_NAME],
+            idle_period=10,
+            raise_on_blocked=False,
+            timeout=TIMEOUT,
+        )
+
+    # the second certificates operator is independent of mongos, deploy it while TLS is disabled
+    await asyncio.gather(_disable_tls(), _deploy_different_certs())
 
     await toggle_tls_mongos(
         ops_test, enable=True, certs_app_name=DIFFERENT_CERTS_APP_NAME
@@ -180,3 +202,22 @@ async def test_mongos_tls_ca_mismatch(ops_test: OpsTest) -> None:
         status="mongos CA and Config-Server CA don't match.",
         timeout=300,
     )
+
+
+async def get_all_sans_ips(ops_test: OpsTest) -> List[str]:
+    """Retrieves the internal and external SANs of every mongos unit concurrently."""
+
+    async def _get_unit_sans_ips(unit) -> List[str]:
+        # both certificates are read by the first call, the second one is served from cache
+        return [
+            await get_sans_ips(ops_test, unit, internal=True),
+            await get_sans_ips(ops_test, unit, internal=False),
+        ]
+
+    units_sans_ips = await asyncio.gather(
+        *(
+            _get_unit_sans_ips(unit)
+            for unit in ops_test.model.applications[MONGOS_APP_NAME].units
+        )
+    )
+    return [sans_ips for unit_sans_ips in units_sans_ips for sans_ips in unit_sans_ips]
@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+# Copyright 2024 Canonical Ltd.
+# See LICENSE file for licensing details.
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+
+
+@pytest_asyncio.fixture(scope="module")
+async def local_charm(built_charm: Path) -> Path:
+    """Returns the charm built from the local source, shared by all upgrade tests."""
+    return built_charm
+
+
+@pytest.fixture(scope="module")
+def mongos_units() -> int:
+    """Upgrades are exercised against several mongos units."""
+    return 3
@@ -1,83 +1,72 @@
-from collections.abc import AsyncGenerator
+import asyncio
 import logging
-import shutil
-import pytest_asyncio
 import pytest
 from pathlib import Path
-import time
-import zipfile
 
 from pytest_operator.plugin import OpsTest
-import tenacity
 
 from ..helpers import (
     MONGOS_APP_NAME,
-    build_cluster,
-    deploy_cluster_components,
+    UPGRADE_CHARMS_CACHE_DIR,
+    charm_with_workload_version,
     get_direct_mongos_client,
-    get_juju_status,
     get_workload_version,
 )
 
 logger = logging.getLogger(__name__)
 UPGRADE_TIMEOUT = 15 * 60
-WAIT_RE_REFRESH = 15
+WAIT_RE_REFRESH = 30
+WORKLOAD_VERSION = Path("workload_version").read_text().strip()
+MAJOR, MINOR, PATCH = WORKLOAD_VERSION.split(".")
 
+# the tests change the deployed cluster, see `--reuse-cluster`
+pytestmark = pytest.mark.usefixtures("modifies_cluster")
 
-@pytest_asyncio.fixture
-async def local_charm(ops_test: OpsTest) -> AsyncGenerator[Path]:
-    new_charm = await ops_test.build_charm(".")
-    yield new_charm
 
-
-@pytest_asyncio.fixture
-def faulty_upgrade_charm(local_charm, tmp_path: Path):
-    fault_charm = tmp_path / "fault_charm.charm"
-    shutil.copy(local_charm, fault_charm)
-    workload_version = Path("workload_version").read_text().strip()
-
-    [major, minor, patch] = workload_version.split(".")
-
-    with zipfile.ZipFile(fault_charm, mode="a") as charm_zip:
-        charm_zip.writestr(
-            "workload_version", f"{int(major) -1}.{minor}.{patch}+testrollback"
-        )
-
-    yield fault_charm
-
-
-@pytest.mark.group(1)
-@pytest.mark.abort_on_fail
-async def test_build_and_deploy(ops_test: OpsTest):
-    """Build and deploy a sharded cluster."""
-    await deploy_cluster_components(ops_test, n_units=3)
-    await build_cluster(ops_test)
+@pytest.fixture(scope="module")
+def faulty_upgrade_charm(local_charm, request: pytest.FixtureRequest) -> Path:
+    return charm_with_workload_version(
+        local_charm,
+        f"{int(MAJOR) -1}.{MINOR}.{PATCH}+testrollback",
+        request.config.cache.mkdir(UPGRADE_CHARMS_CACHE_DIR),
+    )
 
 
 @pytest.mark.group(1)
 @pytest.mark.abort_on_fail
-async def test_rollback(ops_test: OpsTest, local_charm, faulty_upgrade_charm) -> None:
+async def test_rollback(
+    ops_test: OpsTest, deployed_cluster, local_charm, faulty_upgrade_charm
+) -> None:
     mongos_application = ops_test.model.applications[MONGOS_APP_NAME]
 
-    initial_version = Path("workload_version").read_text().strip()
-
     await mongos_application.refresh(path=faulty_upgrade_charm)
     logger.info("Wait for upgrade to fail")
 
-    for attempt in tenacity.Retrying(
-        reraise=True,
-        stop=tenacity.stop_after_delay(UPGRADE_TIMEOUT),
-        wait=tenacity.wait_fixed(10),
-    ):
-        with attempt:
-            assert "Refresh incompatible" in get_juju_status(
-                ops_test.model.name, MONGOS_APP_NAME
-            ), "Not indicating charm incompatible after refresh"
+    def refresh_incompatible() -> bool:
+        return any(
+            "Refresh incompatible" in (status_message or "")
+            for status_message in [
+                mongos_application.status_message,
+                *(unit.workload_status_message for unit in mongos_application.units),
+            ]
+        )
+
+    # statuses are kept up to date by the model's watcher, no need to poll `juju status`
+    await ops_test.model.block_until(
+        refresh_incompatible, timeout=UPGRADE_TIMEOUT, wait_period=2
+    )
 
     logger.info("Re-refresh the charm")
     await mongos_application.refresh(path=local_charm)
-    # sleep to ensure that active status from before re-refresh does not affect below check
-    time.sleep(WAIT_RE_REFRESH)
+    # ensure that active status from before re-refresh does not affect below check, by waiting
+    # for the units to leave it rather than for a fixed period
+    await ops_test.model.block_until(
+        lambda: any(
+            unit.workload_status != "active" for unit in mongos_application.units
+        ),
+        timeout=WAIT_RE_REFRESH,
+        wait_period=1,
+    )
 
     logger.info("Wait for the charm to be rolled back")
     await ops_test.model.wait_for_idle(
@@ -88,9 +77,15 @@ async def test_rollback(ops_test: OpsTest, local_charm, faulty_upgrade_charm) ->
         raise_on_blocked=False,
     )
 
-    for unit in mongos_application.units:
+    async def check_unit_rolled_back(unit) -> None:
         workload_version = await get_workload_version(ops_test, unit.name)
-        assert workload_version == initial_version
+        assert workload_version == WORKLOAD_VERSION
         number = unit.name.split("/")[-1]
-        client = await get_direct_mongos_client(ops_test, int(number))
-        client["test_db"]["test_collection"].insert_one({f"{number}": number})
+        with await get_direct_mongos_client(ops_test, int(number)) as client:
+            await asyncio.to_thread(
+                client["test_db"]["test_collection"].insert_one, {f"{number}": number}
+            )
+
+    await asyncio.gather(
+        *(check_unit_rolled_back(unit) for unit in mongos_application.units)
+    )
@@ -0,0 +1,31 @@
+# Copyright 2024 Canonical Ltd.
+# See LICENSE file for licensing details.
+import pytest
+from ops.testing import Harness
+
+from charms.data_platform_libs.v0.data_interfaces import DatabaseRequiresEvents
+from charm import MongosCharm
+
+# attributes of the events class before any charm adds the custom events for its aliases
+_ORIGINAL_EVENTS = frozenset(vars(DatabaseRequiresEvents))
+
+
+@pytest.fixture(autouse=True)
+def restore_database_requires_events():
+    """Deletes the custom events created for the aliases after each test.
+
+    This is needed because the events are created again in the next test, which causes an error
+    related to duplicated events.
+    """
+    yield
+    for event_name in set(vars(DatabaseRequiresEvents)) - _ORIGINAL_EVENTS:
+        delattr(DatabaseRequiresEvents, event_name)
+
+
+@pytest.fixture
+def harness():
+    """Set up the charm for each unit test."""
+    harness = Harness(MongosCharm)
+    harness.begin()
+    yield harness
+    harness.cleanup()
@@ -2,21 +2,22 @@
 # See LICENSE file for licensing details.
 """Basic unit tests for mongos charm."""
 
-import unittest
+import pytest
 
-from ops.testing import Harness
 
-from charm import MongosCharm
+def test_mongos_host(harness):
+    """Verify that the unit is reached through the endpoints service of the application."""
+    assert harness.charm.get_mongos_host() == "mongos-k8s-0.mongos-k8s-endpoints"
 
 
-class TestCharm(unittest.TestCase):
-    """Basic unit tests for mongos charm."""
+def test_db_initialised(harness):
+    """Verify that the leader stores the db_initialised flag in the peer data."""
+    harness.add_relation("router-peers", "mongos-k8s")
+    harness.set_leader(True)
+    assert not harness.charm.db_initialised
 
-    def setUp(self, *unused):
-        """Set up the charm for each unit test."""
-        self.harness = Harness(MongosCharm)
-        self.addCleanup(self.harness.cleanup)
-        self.harness.begin()
+    harness.charm.db_initialised = True
+    assert harness.charm.db_initialised
 
-    def test_charm(self):
-        """TODO: Implement this test."""
+    with pytest.raises(ValueError):
+        harness.charm.db_initialised = "true"